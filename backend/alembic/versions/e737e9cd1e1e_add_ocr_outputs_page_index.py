@@ -0,0 +1,36 @@
+"""add ocr_outputs page index
+
+Revision ID: e737e9cd1e1e
+Revises:
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e737e9cd1e1e'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Serves per-file page reads ordered by page_number; databases built with
+    # create_all already have it
+    op.create_index(
+        'ix_ocr_outputs_file_deleted_page',
+        'ocr_outputs',
+        ['file_id', 'is_deleted', 'page_number'],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ocr_outputs_file_deleted_page', table_name='ocr_outputs', if_exists=True)
@@ -1,12 +1,14 @@
 import os
 import asyncio
+import aiohttp
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException, Depends, BackgroundTasks
+from sqlalchemy import case, func, insert, select, update
 from sqlalchemy.orm import Session
 from services.file_processing.file_service import upload_file_to_blob, sanitize_filename
 from services.file_processing.pdf_text_extractor import (
-    download_file_to_bytes,
+    download_file_to_bytes_async,
     extract_pdf_markdown,
-    extract_pdf_markdown_pagewise,
+    extract_pdf_markdown_pagewise_async,
     extract_pdf_text,
     to_markdown,
 )
@@ -38,6 +40,49 @@ logger.propagate = False
 router = APIRouter()
 
 
+def _ocr_rows(file_id, pages_data):
+    """Build the OCRInfo pages_json ({"1": markdown, ...}) and the per-page OCROutputs rows in one pass."""
+    pages_json = {}
+    rows = []
+    for page_data in pages_data:
+        page_number = page_data.get("page_number", 1)
+        page_markdown = page_data.get("markdown", "") or ""
+        pages_json[str(page_number)] = page_markdown
+        rows.append({
+            "file_id": file_id,
+            "page_number": page_number,
+            "page_text": page_markdown,
+            "error_msg": None,
+            "is_completed": True,
+        })
+    return pages_json, rows
+
+
+def _ocr_completion_counts(db_session, usecase_id):
+    """Return (files, tracked files, completed files) for a usecase in one aggregate query.
+
+    Tracker rows are first folded per file: older data can hold more than one tracker row
+    per file, and such a file only counts as completed when every one of its rows is, so a
+    stale non-Completed row never marks extraction as done.
+    """
+    trackers = select(
+        FileWorkflowTracker.file_id,
+        func.min(case((FileWorkflowTracker.text_extraction == "Completed", 1), else_=0)).label("completed"),
+    ).join(
+        FileMetadata, FileMetadata.file_id == FileWorkflowTracker.file_id
+    ).where(
+        FileMetadata.usecase_id == usecase_id
+    ).group_by(FileWorkflowTracker.file_id).subquery()
+
+    return db_session.query(
+        func.count(FileMetadata.file_id),
+        func.count(trackers.c.file_id),
+        func.count(trackers.c.file_id).filter(trackers.c.completed == 1),
+    ).select_from(FileMetadata).outerjoin(
+        trackers, trackers.c.file_id == FileMetadata.file_id
+    ).filter(FileMetadata.usecase_id == usecase_id).one()
+
+
 async def check_ocr_completion(usecase_id: int, db_session, max_retries=20, retry_interval=5):
     """
     Check if OCR processing is complete for all files in a usecase.
@@ -53,36 +98,21 @@ async def check_ocr_completion(usecase_id: int, db_session, max_retries=20, retr
     """
     for retry in range(max_retries):
         try:
-            # Get all files for the usecase
-            files = db_session.query(FileMetadata).filter(FileMetadata.usecase_id == usecase_id).all()
+            total_files, tracked_files, completed_files = _ocr_completion_counts(db_session, usecase_id)
             
-            if not files:
+            if not total_files:
                 logger.warning(f"No files found for usecase {usecase_id}")
                 return False
             
-            # Check if text extraction is complete for all files
-            all_complete = True
-            for file in files:
-                # Get workflow tracker for the file
-                workflow_tracker = db_session.query(FileWorkflowTracker).filter(
-                    FileWorkflowTracker.file_id == file.file_id
-                ).first()
-                
-                if not workflow_tracker:
-                    logger.warning(f"No workflow tracker found for file {file.file_id}")
-                    all_complete = False
-                    break
-                
-                # Check if text extraction is completed
-                if workflow_tracker.text_extraction != "Completed":
-                    logger.info(f"Text extraction not complete for file {file.file_id}: Status is {workflow_tracker.text_extraction}")
-                    all_complete = False
-                    break
-            
-            if all_complete:
+            if completed_files == total_files:
                 logger.info(f"Text extraction complete for all files in usecase {usecase_id}")
                 return True
             
+            if tracked_files < total_files:
+                logger.warning(f"No workflow tracker found for {total_files - tracked_files} file(s) in usecase {usecase_id}")
+            else:
+                logger.info(f"Text extraction complete for {completed_files}/{total_files} files in usecase {usecase_id}")
+            
             logger.info(f"Text extraction not yet complete for usecase {usecase_id}, retry {retry+1}/{max_retries}")
             await asyncio.sleep(retry_interval)
         except Exception as e:
@@ -138,86 +168,104 @@ async def upload_file(
             
             logger.info(f"User identified: {user.id} (using usecase {usecase_id})")
 
-            # Toggle text_extraction to In Progress for this usecase
-            try:
-                usecase = db.query(UsecaseMetadata).filter(UsecaseMetadata.usecase_id == usecase_id).first()
-                if usecase:
-                    usecase.text_extraction = "In Progress"
-                    db.commit()
-                    logger.info(f"Set text_extraction='In Progress' for usecase {usecase_id}")
-            except Exception as e:
-                logger.warning(f"Unable to set text_extraction In Progress for usecase {usecase_id}: {e}")
+            # Toggle text_extraction to In Progress for this usecase before the uploads start,
+            # so pollers see the extraction as soon as the request is accepted
+            previous_text_extraction = usecase.text_extraction
+            usecase.text_extraction = "In Progress"
+            db.commit()
+            logger.info(f"Set text_extraction='In Progress' for usecase {usecase_id}")
 
             file_metadata_list = []
-            for i, file in enumerate(files):
-                logger.info(f"Processing file {i+1}/{len(files)}: {file.filename}")
+            try:
+                for i, file in enumerate(files):
+                    if OCRServiceConfigs.VERBOSE_FILE_LOGS:
+                        logger.info(f"Processing file {i+1}/{len(files)}: {file.filename}")
                 
-                # Security: Validate file size
-                file_size = 0
-                file.file.seek(0, os.SEEK_END)
-                file_size = file.file.tell()
-                file.file.seek(0)
+                    # Security: Validate file size
+                    file_size = 0
+                    file.file.seek(0, os.SEEK_END)
+                    file_size = file.file.tell()
+                    file.file.seek(0)
                 
-                if file_size > FileProcessingConfigs.MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=413, 
-                        detail=f"File {file.filename} exceeds the maximum size limit of {FileProcessingConfigs.MAX_FILE_SIZE // (1024 * 1024)}MB"
-                    )
+                    if file_size > FileProcessingConfigs.MAX_FILE_SIZE:
+                        raise HTTPException(
+                            status_code=413, 
+                            detail=f"File {file.filename} exceeds the maximum size limit of {FileProcessingConfigs.MAX_FILE_SIZE // (1024 * 1024)}MB"
+                        )
                 
-                # Security: Validate file type
-                extension = os.path.splitext(file.filename)[1].lower()
-                if extension not in FileProcessingConfigs.ALLOWED_EXTENSIONS:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File extension {extension} is not allowed. Supported: {', '.join(FileProcessingConfigs.ALLOWED_EXTENSIONS)}"
-                    )
+                    # Security: Validate file type
+                    extension = os.path.splitext(file.filename)[1].lower()
+                    if extension not in FileProcessingConfigs.ALLOWED_EXTENSIONS:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File extension {extension} is not allowed. Supported: {', '.join(FileProcessingConfigs.ALLOWED_EXTENSIONS)}"
+                        )
                 
-                if file.content_type not in FileProcessingConfigs.ALLOWED_MIME_TYPES:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File type {file.content_type} is not allowed. Supported: {', '.join(FileProcessingConfigs.ALLOWED_MIME_TYPES)}"
-                    )
-
-                success, message, url = upload_file_to_blob(file)
-                logger.info(f"Blob storage upload result for {file.filename}: Success={success}, Message={message}")
-                logger.info(f"File URL: {url}")
-                if success:
-                    safe_filename = sanitize_filename(file.filename)
-                    logger.info(f"Creating metadata entry for file: {safe_filename}")
-                    file_metadata = FileMetadata(
-                        file_id=uuid4(),
-                        file_name=safe_filename,
-                        file_link=url,
-                        user_id=user.id,
-                        usecase_id=usecase_id,
-                        created_at=datetime.utcnow(),
-                        updated_at=datetime.utcnow()
-                    )
-                    db.add(file_metadata)
-                    file_metadata_list.append(file_metadata)
-                else:
-                    logger.error(f"Failed to upload file {file.filename}: {message}")
-                    raise HTTPException(status_code=500, detail=message)
+                    if file.content_type not in FileProcessingConfigs.ALLOWED_MIME_TYPES:
+                        raise HTTPException(
+                            status_code=400,
+                            detail=f"File type {file.content_type} is not allowed. Supported: {', '.join(FileProcessingConfigs.ALLOWED_MIME_TYPES)}"
+                        )
+
+                    success, message, url = upload_file_to_blob(file)
+                    if OCRServiceConfigs.VERBOSE_FILE_LOGS:
+                        logger.info(f"Blob storage upload result for {file.filename}: Success={success}, Message={message}")
+                        logger.info(f"File URL: {url}")
+                    if success:
+                        safe_filename = sanitize_filename(file.filename)
+                        if OCRServiceConfigs.VERBOSE_FILE_LOGS:
+                            logger.info(f"Creating metadata entry for file: {safe_filename}")
+                        now = datetime.utcnow()
+                        file_metadata = FileMetadata(
+                            file_id=uuid4(),
+                            file_name=safe_filename,
+                            file_link=url,
+                            user_id=user.id,
+                            usecase_id=usecase_id,
+                            created_at=now,
+                            updated_at=now
+                        )
+                        db.add(file_metadata)
+                        file_metadata_list.append(file_metadata)
+                    else:
+                        logger.error(f"Failed to upload file {file.filename}: {message}")
+                        raise HTTPException(status_code=500, detail=message)
             
-            logger.info("Committing metadata to database")
-            db.commit()
+                logger.info("Committing metadata to database")
+                db.commit()
+            except Exception:
+                # A rejected or failed upload must not leave the usecase stuck In Progress
+                db.rollback()
+                db.execute(
+                    update(UsecaseMetadata)
+                    .where(UsecaseMetadata.usecase_id == usecase_id)
+                    .values(text_extraction=previous_text_extraction)
+                )
+                db.commit()
+                raise
 
             # Immediately process PDFs into Markdown and upsert OCR rows (page-wise)
             processed_count = 0
-            for metadata in file_metadata_list:
-                try:
-                    bytes_data = download_file_to_bytes(metadata.file_link)
-                    logger.info(f"Read bytes for file_id={metadata.file_id} name={metadata.file_name}: {len(bytes_data)} bytes")
-                    
+            # Downloads and extraction run concurrently, bounded by the per-task file count.
+            # Each file's rows are written as soon as it finishes, so DB writes overlap the
+            # remaining extractions; writes stay sequential on this request's session
+            extract_sem = asyncio.Semaphore(max(1, ocr_batch_size))
+
+            async def _extract_file(metadata, http_session):
+                async with extract_sem:
+                    bytes_data = await download_file_to_bytes_async(metadata.file_link, http_session)
+                    if OCRServiceConfigs.VERBOSE_FILE_LOGS:
+                        logger.info(f"Read bytes for file_id={metadata.file_id} name={metadata.file_name}: {len(bytes_data)} bytes")
+
                     # Extract page-wise markdown
-                    pages_data = extract_pdf_markdown_pagewise(bytes_data)
+                    pages_data = await extract_pdf_markdown_pagewise_async(bytes_data)
                     extractor = "pdfplumber"
-                    
+
                     # Fallback to single-page extraction if page-wise fails or returns empty
                     if not pages_data or all(not p.get("markdown", "").strip() for p in pages_data):
-                        md = extract_pdf_markdown(bytes_data)
+                        md = await asyncio.to_thread(extract_pdf_markdown, bytes_data)
                         if not md:
-                            txt = extract_pdf_text(bytes_data)
+                            txt = await asyncio.to_thread(extract_pdf_text, bytes_data)
                             md = to_markdown(txt)
                             extractor = "fallback"
                         # Convert single markdown to page-wise format
@@ -226,100 +274,91 @@ async def upload_file(
                     else:
                         total_chars = sum(len(p.get("markdown", "")) for p in pages_data)
                         logger.info(f"Markdown extractor={extractor} (page-wise) pages={len(pages_data)} total_chars={total_chars} for file_id={metadata.file_id}")
+                    return pages_data
 
-                    total_pages = len(pages_data)
-                    
-                    # Build JSON structure with page numbers as keys
-                    pages_json = {}
-                    for page_data in pages_data:
-                        page_number = page_data.get("page_number", 1)
-                        page_markdown = page_data.get("markdown", "")
-                        pages_json[str(page_number)] = page_markdown or ""
-
-                    # Upsert OCRInfo
-                    info = db.query(OCRInfo).filter(OCRInfo.file_id == metadata.file_id).first()
-                    if not info:
-                        info = OCRInfo(
+            async def _extract_file_result(metadata, http_session):
+                try:
+                    return metadata, await _extract_file(metadata, http_session)
+                except Exception as e:
+                    return metadata, e
+
+            # One HTTP session for the whole upload so remote files share keep-alive connections
+            async with aiohttp.ClientSession() as http_session:
+                for next_done in asyncio.as_completed([
+                    _extract_file_result(metadata, http_session) for metadata in file_metadata_list
+                ]):
+                    metadata, pages_data = await next_done
+                    try:
+                        if isinstance(pages_data, Exception):
+                            raise pages_data
+
+                        total_pages = len(pages_data)
+
+                        # file_id was minted with uuid4() above, so there are no existing OCR rows to
+                        # merge with: OCRInfo and the per-page OCROutputs (kept for backward
+                        # compatibility) are inserted directly, the pages in one bulk INSERT.
+                        pages_json, ocr_rows = _ocr_rows(metadata.file_id, pages_data)
+                        db.add(OCRInfo(
                             file_id=metadata.file_id,
                             total_pages=total_pages,
                             completed_pages=total_pages,
                             error_pages=0,
                             pages_json=pages_json,
-                        )
-                        db.add(info)
-                    else:
-                        info.total_pages = total_pages
-                        info.completed_pages = total_pages
-                        info.error_pages = 0
-                        info.pages_json = pages_json
-
-                    # Store each page separately in OCROutputs (for backward compatibility)
-                    for page_data in pages_data:
-                        page_number = page_data.get("page_number", 1)
-                        page_markdown = page_data.get("markdown", "")
-                        
-                        out = db.query(OCROutputs).filter(
-                            OCROutputs.file_id == metadata.file_id,
-                            OCROutputs.page_number == page_number,
-                        ).first()
-                        if not out:
-                            out = OCROutputs(
-                                file_id=metadata.file_id,
-                                page_number=page_number,
-                                page_text=page_markdown or "",
-                                is_completed=True,
-                            )
-                            db.add(out)
-                        else:
-                            out.page_text = page_markdown or ""
-                        out.error_msg = None
-                        out.is_completed = True
-                    
-                    db.commit()
-                    processed_count += 1
-                except Exception as e:
-                    db.rollback()
-                    logger.error(f"Error processing PDF for file_id={metadata.file_id}: {e}", exc_info=True)
+                        ))
+                        if ocr_rows:
+                            db.execute(insert(OCROutputs), ocr_rows)
+                
+                        db.commit()
+                        processed_count += 1
+                    except Exception as e:
+                        db.rollback()
+                        logger.error(f"Error processing PDF for file_id={metadata.file_id}: {e}", exc_info=True)
 
             # After processing all files, add PDF markers to chat_history and set usecase text_extraction status
             try:
-                usecase2 = db.query(UsecaseMetadata).filter(UsecaseMetadata.usecase_id == usecase_id).first()
-                if usecase2:
-                    usecase2.text_extraction = "Completed" if processed_count > 0 else "Failed"
-                    
-                    # PDF markers will be created in gemini_chat endpoint after user message is added
-                    # This ensures correct ordering: User message → PDF marker → Agent response
-                    
-                    db.commit()
-                    logger.info(f"Set text_extraction='{usecase2.text_extraction}' for usecase {usecase_id} (processed={processed_count})")
-                    
-                    # Stage 2: Generate usecase name from extracted documents
-                    # Only trigger if text extraction completed and we processed at least one file
-                    if usecase2.text_extraction == "Completed" and processed_count > 0:
-                        try:
-                            from services.llm.usecase_naming_agent import (
-                                _run_document_naming_task
+                # One UPDATE by primary key: the usecase row was expired by the per-file commits
+                # and would otherwise be re-selected just to flip this column
+                final_status = "Completed" if processed_count > 0 else "Failed"
+                db.execute(
+                    update(UsecaseMetadata)
+                    .where(UsecaseMetadata.usecase_id == usecase_id)
+                    .values(text_extraction=final_status)
+                    .execution_options(synchronize_session=False)
+                )
+                
+                # PDF markers will be created in gemini_chat endpoint after user message is added
+                # This ensures correct ordering: User message → PDF marker → Agent response
+                
+                db.commit()
+                logger.info(f"Set text_extraction='{final_status}' for usecase {usecase_id} (processed={processed_count})")
+                
+                # Stage 2: Generate usecase name from extracted documents
+                # Only trigger if text extraction completed and we processed at least one file
+                if final_status == "Completed" and processed_count > 0:
+                    try:
+                        from services.llm.usecase_naming_agent import (
+                            _run_document_naming_task
+                        )
+                        from core.env_config import get_env_variable
+                        
+                        api_key = get_env_variable("GEMINI_API_KEY", "")
+                        if api_key:
+                            logger.info(f"Text extraction completed for usecase {usecase_id} (processed {processed_count} files), scheduling document-based naming...")
+                            # Run as background task (don't block the main flow)
+                            # The task will create its own DB session, so data must be committed first (which we just did)
+                            background_tasks.add_task(
+                                _run_document_naming_task,
+                                usecase_id,
+                                api_key
                             )
-                            from core.env_config import get_env_variable
-                            
-                            api_key = get_env_variable("GEMINI_API_KEY", "")
-                            if api_key:
-                                logger.info(f"Text extraction completed for usecase {usecase_id} (processed {processed_count} files), scheduling document-based naming...")
-                                # Run as background task (don't block the main flow)
-                                # The task will create its own DB session, so data must be committed first (which we just did)
-                                background_tasks.add_task(
-                                    _run_document_naming_task,
-                                    usecase_id,
-                                    api_key
-                                )
-                                logger.info(f"Scheduled document-based naming task for usecase {usecase_id}")
-                            else:
-                                logger.warning(f"Cannot generate name: GEMINI_API_KEY not configured")
-                        except Exception as naming_error:
-                            logger.error(f"Error scheduling Stage 2 naming for usecase {usecase_id}: {naming_error}", exc_info=True)
-                            # Don't fail the file upload if naming fails
-                    else:
-                        logger.debug(f"Skipping Stage 2 naming: text_extraction={usecase2.text_extraction}, processed_count={processed_count}")
+                            logger.info(f"Scheduled document-based naming task for usecase {usecase_id}")
+                        else:
+                            logger.warning(f"Cannot generate name: GEMINI_API_KEY not configured")
+                    except Exception as naming_error:
+                        logger.error(f"Error scheduling Stage 2 naming for usecase {usecase_id}: {naming_error}", exc_info=True)
+                        # Don't fail the file upload if naming fails
+                else:
+                    logger.debug(f"Skipping Stage 2 naming: text_extraction={final_status}, processed_count={processed_count}")
             except Exception as e:
                 logger.warning(f"Unable to finalize text_extraction for usecase {usecase_id}: {e}")
 
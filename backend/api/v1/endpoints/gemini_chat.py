@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
+import asyncio
 import uuid
 import logging
 from datetime import datetime, timezone, timedelta
@@ -11,7 +12,7 @@ import json
 from deps import get_db
 from models.file_processing.file_metadata import FileMetadata
 from models.file_processing.ocr_records import OCRInfo, OCROutputs
-from services.file_processing.pdf_text_extractor import download_file_to_bytes, extract_pdf_text, to_markdown, extract_pdf_markdown
+from services.file_processing.pdf_text_extractor import download_file_to_bytes_async, extract_pdf_text, to_markdown, extract_pdf_markdown
 from core.config import OCRServiceConfigs
 from db.session import get_db_context
 from models.usecase.usecase import UsecaseMetadata
@@ -448,21 +449,53 @@ async def append_gemini_chat_message(
                     db.add(fm)
                     db.flush()  # get file_id
                 resolved_files.append(fm)
-            # For each resolved file, extract text and upsert OCR rows (idempotent)
-            for fm in resolved_files:
-                # Download/read file bytes
-                bytes_data = download_file_to_bytes(fm.file_link)
+            # Existing OCR rows for all resolved files are loaded in two IN queries up front
+            # rather than two lookups per file
+            file_ids = [fm.file_id for fm in resolved_files]
+            infos_by_file = {}
+            outputs_by_file = {}
+            if file_ids:
+                infos_by_file = {
+                    info.file_id: info
+                    for info in db.query(OCRInfo).filter(OCRInfo.file_id.in_(file_ids))
+                }
+                outputs_by_file = {
+                    output.file_id: output
+                    for output in db.query(OCROutputs).filter(
+                        OCROutputs.file_id.in_(file_ids),
+                        OCROutputs.page_number == 1,
+                    )
+                }
+            async def _extract_markdown(fm):
+                # Download/read file bytes without blocking the event loop
+                bytes_data = await download_file_to_bytes_async(fm.file_link)
                 if not bytes_data:
                     logging.getLogger(__name__).warning(
                         "No bytes read for file_link=%s (file_name=%s)", fm.file_link, fm.file_name
                     )
                 # Prefer robust markdown extractor
-                md_text = extract_pdf_markdown(bytes_data)
+                md_text = await asyncio.to_thread(extract_pdf_markdown, bytes_data)
                 extractor_used = "pdfplumber"
                 if not md_text:
-                    text = extract_pdf_text(bytes_data)
+                    text = await asyncio.to_thread(extract_pdf_text, bytes_data)
                     md_text = to_markdown(text)
                     extractor_used = "fallback"
+                return md_text, extractor_used
+
+            # All files are downloaded and extracted concurrently; a failing file is logged
+            # and skipped instead of aborting the others
+            extracted = await asyncio.gather(
+                *(_extract_markdown(fm) for fm in resolved_files),
+                return_exceptions=True,
+            )
+            # For each resolved file, upsert OCR rows (idempotent)
+            for fm, result in zip(resolved_files, extracted):
+                if isinstance(result, Exception):
+                    logging.getLogger(__name__).error(
+                        "Error extracting uploaded file %s (id=%s): %s", fm.file_name, str(fm.file_id), result
+                    )
+                    continue
+                md_text, extractor_used = result
                 # Ensure fenced code block formatting if text still lacks markdown cues
                 if md_text and not any(sym in md_text for sym in ("# ", "- ", "1. ")):
                     # Wrap in a paragraph to make it explicit markdown content
@@ -483,7 +516,7 @@ async def append_gemini_chat_message(
                         snippet = snippet[:max_len] + "... [TRUNCATED]"
                     logger.info("Markdown PDF text (snippet):\n%s", snippet if snippet else "[EMPTY]")
                 # Upsert OCRInfo (single row per file)
-                info = db.query(OCRInfo).filter(OCRInfo.file_id == fm.file_id).first()
+                info = infos_by_file.get(fm.file_id)
                 if not info:
                     info = OCRInfo(
                         file_id=fm.file_id,
@@ -497,10 +530,7 @@ async def append_gemini_chat_message(
                     info.completed_pages = 1
                     info.error_pages = 0
                 # Upsert OCROutputs for page 1
-                output = db.query(OCROutputs).filter(
-                    OCROutputs.file_id == fm.file_id,
-                    OCROutputs.page_number == 1,
-                ).first()
+                output = outputs_by_file.get(fm.file_id)
                 if not output:
                     output = OCROutputs(
                         file_id=fm.file_id,
@@ -27,6 +27,10 @@ class DatabasePoolConfigs:
     POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
     POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
     ECHO = os.getenv("DB_ECHO", "false").lower() == "true"
+    # Separate, smaller pool for the async engine (agent tool reads); each worker may hold
+    # up to POOL_SIZE + MAX_OVERFLOW + ASYNC_POOL_SIZE + ASYNC_MAX_OVERFLOW connections
+    ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))
+    ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "10"))
 
 class OCRServiceConfigs:
     NUM_FILES_PER_BACKGROUND_TASK = int(os.getenv("OCR_NUM_FILES_PER_TASK", "2"))
@@ -37,6 +41,8 @@ class OCRServiceConfigs:
     # Security: Control OCR text logging to prevent sensitive content exposure
     LOG_OCR_TEXT = os.getenv("LOG_OCR_TEXT", "false").lower() == "true"
     OCR_TEXT_LOG_MAX_LENGTH = int(os.getenv("OCR_TEXT_LOG_MAX_LENGTH", "200"))  # Limit logged text length
+    # Per-file step logs during upload/extraction (off by default; one summary line per file is always logged)
+    VERBOSE_FILE_LOGS = os.getenv("OCR_VERBOSE_FILE_LOGS", "false").lower() == "true"
 
 
 class FileProcessingConfigs:
@@ -44,6 +50,12 @@ class FileProcessingConfigs:
     # Max file size in bytes (default: 50MB)
     MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(50 * 1024 * 1024)))
     
+    # Worker processes shared by all page-wise PDF extractions (default: one per CPU)
+    EXTRACT_WORKERS = max(1, int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1))))
+    
+    # Minimum pages per worker shard; shorter documents are extracted in-process
+    EXTRACT_SHARD_MIN_PAGES = max(1, int(os.getenv("PDF_EXTRACT_SHARD_MIN_PAGES", "8")))
+    
     # Allowed file extensions
     ALLOWED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg", ".txt", ".md"}
     
@@ -64,6 +76,13 @@ class AgentLogConfigs:
     LOG_AGENT_SYSTEM_PROMPT_MAX_LENGTH = int(os.getenv("LOG_AGENT_SYSTEM_PROMPT_MAX_LENGTH", "10000"))
     LOG_AGENT_RAW_OUTPUT = os.getenv("LOG_AGENT_RAW_OUTPUT", "false").lower() == "true"
     LOG_AGENT_RAW_OUTPUT_MAX_LENGTH = int(os.getenv("LOG_AGENT_RAW_OUTPUT_MAX_LENGTH", "20000"))
+    # Toggle the agent input summary block (ANSI red); on by default
+    LOG_AGENT_INPUT = os.getenv("LOG_AGENT_INPUT", "true").lower() == "true"
+
+
+class AgentRuntimeConfigs:
+    # Upper bound on one agent turn (all faithfulness passes) before it is cancelled
+    TURN_TIMEOUT_S = float(os.getenv("AGENT_TURN_TIMEOUT_S", "600"))
 
 
 class Settings(BaseSettings):
@@ -120,6 +139,9 @@ class DatabaseConfigs:
 class FirebaseConfigs:
     STORAGE_BUCKET = os.getenv("FIREBASE_STORAGE_BUCKET", "")
     SERVICE_ACCOUNT_PATH = os.getenv("FIREBASE_SERVICE_ACCOUNT_PATH", "serviceAccountKey.json")
+    # Set when the bucket grants allUsers roles/storage.objectViewer (uniform access);
+    # uploads then skip the per-object make_public() ACL request
+    UNIFORM_PUBLIC_READ = os.getenv("FIREBASE_UNIFORM_PUBLIC_READ", "false").lower() == "true"
 
 
 class FileStorageConfigs:
@@ -1,9 +1,16 @@
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, make_url
 from sqlalchemy.orm import sessionmaker
-from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from contextlib import contextmanager, asynccontextmanager
 from core.config import DatabaseConfigs, DatabasePoolConfigs
 
 
+def _json_serializer(obj) -> str:
+    # JSON/JSONB columns (agent traces, chat history) are encoded with orjson
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
 engine = create_engine(
     DatabaseConfigs.DATABASE_URL,
     pool_size=DatabasePoolConfigs.POOL_SIZE,
@@ -12,11 +19,27 @@ engine = create_engine(
     pool_recycle=DatabasePoolConfigs.POOL_RECYCLE,
     pool_pre_ping=DatabasePoolConfigs.POOL_PRE_PING,
     echo=DatabasePoolConfigs.ECHO,
+    json_serializer=_json_serializer,
     connect_args={"sslmode": "require"} if "sslmode=require" in DatabaseConfigs.DATABASE_URL else {},
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine on the psycopg (v3) driver for coroutine callers such as agent tools
+async_engine = create_async_engine(
+    make_url(DatabaseConfigs.DATABASE_URL).set(drivername="postgresql+psycopg"),
+    pool_size=DatabasePoolConfigs.ASYNC_POOL_SIZE,
+    max_overflow=DatabasePoolConfigs.ASYNC_MAX_OVERFLOW,
+    pool_timeout=DatabasePoolConfigs.POOL_TIMEOUT,
+    pool_recycle=DatabasePoolConfigs.POOL_RECYCLE,
+    pool_pre_ping=DatabasePoolConfigs.POOL_PRE_PING,
+    echo=DatabasePoolConfigs.ECHO,
+    json_serializer=_json_serializer,
+    connect_args={"sslmode": "require"} if "sslmode=require" in DatabaseConfigs.DATABASE_URL else {},
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -39,3 +62,31 @@ def get_db_context():
         db.close()
 
 
+@contextmanager
+def get_db_readonly_context():
+    """Session for pure reads: no COMMIT on exit and no expiry of loaded objects.
+
+    Returning the connection still ends the implicit transaction: the pool's
+    reset-on-return issues a ROLLBACK, so the round-trip is not avoided.
+    """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def get_async_db_readonly_context():
+    """Async counterpart of get_db_readonly_context: no COMMIT on exit for pure reads
+    (the pool still rolls the connection back when it is returned)."""
+    db = AsyncSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def release_async_engine():
+    """Close pooled async connections; required before the owning event loop shuts down."""
+    await async_engine.dispose()
@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 load_dotenv()  # Load environment variables before importing config classes
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -20,8 +21,23 @@ Base.metadata.create_all(bind=engine)
 setup_logging()
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Shutdown: stop the agent loop (disposing its async DB pool), persist queued traces,
+    # then return any async connections opened on the app's own loop
+    import asyncio
+    from services.agent.agent_runner import shutdown_agent_loop
+    from services.agent.callbacks import flush_traces
+    from db.session import release_async_engine
+    await shutdown_agent_loop()
+    await asyncio.to_thread(flush_traces)
+    await release_async_engine()
+
+
 # Create FastAPI app
-app = FastAPI(title="cortexa backend")
+app = FastAPI(title="cortexa backend", lifespan=lifespan)
 
 # Import security configurations
 from core.config import CORSConfigs, SecurityConfigs
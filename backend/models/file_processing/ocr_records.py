@@ -6,6 +6,7 @@ from sqlalchemy import (
     Integer,
     Boolean,
     Text,
+    Index,
     func,
 )
 from sqlalchemy.dialects.postgresql import UUID as pgUUID, JSON
@@ -33,6 +34,10 @@ class OCRInfo(Base):
 
 class OCROutputs(Base):
     __tablename__ = "ocr_outputs"
+    # Serves per-file page reads ordered by page_number (agent document reads)
+    __table_args__ = (
+        Index("ix_ocr_outputs_file_deleted_page", "file_id", "is_deleted", "page_number"),
+    )
     id = Column(pgUUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     file_id = Column(pgUUID(as_uuid=True), ForeignKey("file_metadata.file_id"))
     page_number = Column(Integer, nullable=False)
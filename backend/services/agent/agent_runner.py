@@ -1,10 +1,18 @@
 import logging
 import os
 import json
+import re
 import warnings
+import orjson
 import asyncio
+import concurrent.futures
+import threading
+import operator
 import time
-from datetime import datetime
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from functools import lru_cache
 from typing import Any, Dict, List, Tuple, Optional, Callable
 from uuid import UUID
 try:
@@ -12,9 +20,14 @@ try:
 except ImportError:
     # Fallback for environments/editors that don't resolve langchain_core
     from langchain.tools import tool as lc_tool
-from sqlalchemy import text
+try:
+    from deepagents import create_deep_agent
+except ImportError:
+    # Agent turns fall back to the rule-based flow
+    create_deep_agent = None
+from sqlalchemy import text, select
 
-from db.session import get_db_context
+from db.session import get_db_context, get_db_readonly_context, get_async_db_readonly_context, release_async_engine
 from models.usecase.usecase import UsecaseMetadata
 from models.file_processing.ocr_records import OCROutputs, OCRInfo
 from models.file_processing.file_metadata import FileMetadata
@@ -24,8 +37,8 @@ from models.generator.test_case import TestCase
 from services.llm.gemini_conversational.history_manager import manage_chat_history_for_usecase
 from services.llm.gemini_conversational.faithfulness_agent import FaithfulnessAgent
 from core.env_config import get_env_variable
-from core.config import AgentLogConfigs
-from services.agent.callbacks import DatabaseTraceCallback
+from core.config import AgentLogConfigs, AgentRuntimeConfigs
+from services.agent.callbacks import DatabaseTraceCallback, enqueue_trace, flush_traces
 import importlib
 
 logger = logging.getLogger(__name__)
@@ -39,8 +52,134 @@ warnings.filterwarnings(
 )
 
 
+# ANSI escape prefixes, built once per color code
+_ANSI = {code: f"\033[{code}m" for code in ("31", "32", "33", "34", "35", "36")}
+_CRESET = "\033[0m"
+
+
 def _color(text: str, code: str) -> str:
-    return f"\033[{code}m{text}\033[0m"
+    prefix = _ANSI.get(code) or f"\033[{code}m"
+    return f"{prefix}{text}{_CRESET}"
+
+
+# Resolved once at import; used on the streaming/fallback hot paths
+_LOG_RAW = AgentLogConfigs.LOG_AGENT_RAW_OUTPUT
+_LOG_RAW_MAX = AgentLogConfigs.LOG_AGENT_RAW_OUTPUT_MAX_LENGTH
+_LOG_INPUT = AgentLogConfigs.LOG_AGENT_INPUT
+_C32 = _ANSI["32"]
+_C33 = _ANSI["33"]
+_C34 = _ANSI["34"]
+_C35 = _ANSI["35"]
+_C36 = _ANSI["36"]
+
+
+# Patterns used when unpacking model output; compiled once at import
+_CODE_FENCE_RE = re.compile(r"```json\s*([\s\S]*?)\s*```", re.IGNORECASE)
+_TEXT_FIELD_RE = re.compile(r"(?:'text'|\"text\")\s*:\s*(?:'([^']*)'|\"([^\"]*)\")")
+_SQ_TEXT_FIELD_RE = re.compile(r"'text'\s*:\s*'([^']*(?:''[^']*)*)'")
+_DQ_TEXT_FIELD_RE = re.compile(r'"text"\s*:\s*"([^"]*(?:\\"[^"]*)*)"')
+
+
+# Fallback-path intent phrases; each list is matched by one compiled alternation (single pass, no lower() copy)
+_FALLBACK_REQ_PHRASES = (
+    "generate requirements", "extract requirements", "create requirements",
+    "requirements list", "preconditions of requirements", "read requirements",
+)
+_FALLBACK_DOC_PHRASES = (
+    "read the pdf",
+    "read the document",
+    "read the documents",
+    "look into this document",
+    "summarize",
+    "summarise",
+    "summarize the file",
+    "summarize the pdf",
+    "extract key points",
+    "what does this attachment",
+    "get details from the uploaded",
+    "analyze the document",
+    "analyze documents",
+)
+_FALLBACK_REQ_RE = re.compile("|".join(map(re.escape, _FALLBACK_REQ_PHRASES)), re.IGNORECASE)
+_FALLBACK_DOC_RE = re.compile("|".join(map(re.escape, _FALLBACK_DOC_PHRASES)), re.IGNORECASE)
+
+
+# Intent phrase tables for the pre-run checks and post-run fallbacks; built once at import
+_REQ_GEN_KEYWORDS = (
+    "generate requirements", "extract requirements", "create requirements",
+    "requirements list", "generate requirement", "extract requirement",
+    "start requirement generation", "begin requirement generation",
+)
+_SCENARIO_GEN_KEYWORDS = (
+    "generate scenarios", "create scenarios", "generate test scenarios",
+    "scenario generation", "generate scenario", "create scenario",
+    "start scenario generation", "begin scenario generation",
+    "scenarios for these requirements", "scenarios for requirements",
+    "generate scanerios", "scanerios",  # Handle common typos
+    "scenario", "scenarios",  # More flexible matching
+)
+_TESTCASE_GEN_KEYWORDS = (
+    "generate test cases", "create test cases", "generate testcases",
+    "test case generation", "generate test case", "create test case",
+    "start test case generation", "begin test case generation",
+    "test cases for these scenarios", "test cases for scenarios",
+    "generate testcases", "testcases",  # Handle common typos
+)
+_SHOW_REQ_KEYWORDS = (
+    "show requirements", "display requirements", "show me the requirements",
+    "view requirements", "show the requirements", "can i see them",
+    "can i see the requirements", "can you show the requirements",
+    "can you show them", "if requirements are done, can i see them",
+    "i want to see the requirements", "i want to see them",
+    "show them", "show it", "let me see the requirements",
+)
+_SHOW_SCEN_KEYWORDS = (
+    "show scenarios", "display scenarios", "show me the scenarios",
+    "view scenarios", "show the scenarios", "can i see the scenarios",
+    "can you show the scenarios", "can you show them",
+    "if scenarios are done, can i see them", "if scenarios are done, can you show them",
+    "i want to see the scenarios", "i want to see them",
+    "show them", "show it", "let me see the scenarios",
+)
+_SHOW_TC_KEYWORDS = (
+    "show test cases", "display test cases", "show me the test cases",
+    "view test cases", "show the test cases", "can i see the test cases",
+    "can you show the test cases", "can you show them",
+    "if test cases are done, can i see them", "if test cases are done, can you show them",
+    "i want to see the test cases", "i want to see them",
+    "show them", "show it", "let me see the test cases",
+)
+
+
+def _is_plain_text(s: str) -> bool:
+    """True when s has no code fence, JSON object/array, or text-field chunk to unpack."""
+    return (
+        "```" not in s
+        and not s.startswith(("{", "["))
+        and "'text'" not in s
+        and '"text"' not in s
+    )
+
+
+# Message content accessors, chosen once per stream based on the message shape
+_attr_content = operator.attrgetter("content")
+_dict_content = operator.methodcaller("get", "content")
+
+
+@lru_cache(maxsize=8)
+def _read_prompt_file(path: str, mtime_ns: int) -> str:
+    """Read a prompt file; keyed on mtime so edits are picked up without a restart."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _utc_iso(ts: float) -> str:
+    # Same shape as before ("...Z"); avoids the naive utcnow() plus string concat
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+# Most recent tool calls kept per turn in the structured trace
+_MAX_TRACE_TOOL_CALLS = 256
 
 
 # Trace collector for structured traces (no raw chain-of-thought)
@@ -49,9 +188,19 @@ class TraceCollector:
         self.data: Dict[str, Any] = {
             "engine": None,  # "deepagents" | "fallback"
             "messages": {"assistant_final": None},
-            "tool_calls": [],
+            # Bounded so a runaway turn cannot bloat the trace persisted into chat_history
+            "tool_calls": deque(maxlen=_MAX_TRACE_TOOL_CALLS),
             "planning": {"todos": [], "subagents": [], "filesystem_ops": []},
         }
+        # Names of tools invoked this turn, so post-run checks avoid scanning tool_calls
+        self._called_tools: set = set()
+        # One wall-clock reading per turn; tool timestamps are perf_counter offsets from it,
+        # formatted only when the trace is dumped
+        self._wall0 = time.time()
+        self._perf0 = time.perf_counter()
+        self.turn_started_at = _utc_iso(self._wall0)
+        # Results of read-only tools keyed by (tool_name, *args); lives for this turn only
+        self._call_cache: Dict[tuple, Any] = {}
 
     def set_engine(self, engine: str) -> None:
         self.data["engine"] = engine
@@ -70,17 +219,31 @@ class TraceCollector:
         entry = {
             "name": name,
             "args_preview": args_preview,
-            "started_at": datetime.utcnow().isoformat() + "Z",
+            "started_at": None,
             "finished_at": None,
             "duration_ms": None,
             "ok": None,
             "error": None,
             "result_preview": None,
             "chars_read": None,
+            "_t_start": time.perf_counter(),
         }
         self.data["tool_calls"].append(entry)
+        self._called_tools.add(name)
         return entry
 
+    def was_called(self, name: str) -> bool:
+        return name in self._called_tools
+
+    def cached_result(self, key: tuple) -> Any:
+        return self._call_cache.get(key)
+
+    def cache_result(self, key: tuple, result: Any) -> None:
+        # Error payloads are not cached so a retry in the same turn can succeed
+        if isinstance(result, dict) and "error" in result:
+            return
+        self._call_cache[key] = result
+
     def finish_tool(
         self,
         entry: Dict[str, Any],
@@ -91,15 +254,31 @@ class TraceCollector:
         duration_ms: Optional[int] = None,
         chars_read: Optional[int] = None,
     ) -> None:
-        entry["finished_at"] = datetime.utcnow().isoformat() + "Z"
+        t_end = time.perf_counter()
+        entry["_t_end"] = t_end
+        if duration_ms is None:
+            duration_ms = int((t_end - entry["_t_start"]) * 1000)
         entry["ok"] = ok
         entry["error"] = error
         entry["result_preview"] = result_preview
         entry["duration_ms"] = duration_ms
         entry["chars_read"] = chars_read
 
+    def _iso_at(self, t: float) -> str:
+        return _utc_iso(self._wall0 + (t - self._perf0))
+
     def dump(self) -> Dict[str, Any]:
-        return self.data
+        data = dict(self.data)
+        data["turn_started_at"] = self.turn_started_at
+        tool_calls = []
+        for entry in self.data["tool_calls"]:
+            out = {k: v for k, v in entry.items() if not k.startswith("_")}
+            out["started_at"] = self._iso_at(entry["_t_start"])
+            if "_t_end" in entry:
+                out["finished_at"] = self._iso_at(entry["_t_end"])
+            tool_calls.append(out)
+        data["tool_calls"] = tool_calls
+        return data
 
 
 # --- Conversation context helpers ---
@@ -121,16 +300,17 @@ def _extract_assistant_text(raw: Any) -> str:
                 pass
         s = raw if isinstance(raw, str) else str(raw)
         s = s.strip()
+        # Plain prose: nothing below can match, skip the regex and json.loads attempts
+        if _is_plain_text(s):
+            return s[:4000]
         # Try code-fenced JSON first
         try:
-            import re as _re
-            m = _re.search(r"```json\s*([\s\S]*?)\s*```", s, _re.IGNORECASE)
+            m = _CODE_FENCE_RE.search(s)
             if m:
                 s_try = m.group(1)
             else:
                 s_try = s
-            import json as _json
-            data = _json.loads(s_try)
+            data = json.loads(s_try)
             if isinstance(data, dict):
                 if "user_answer" in data:
                     return str(data.get("user_answer") or "")[:4000]
@@ -138,14 +318,13 @@ def _extract_assistant_text(raw: Any) -> str:
                     # UI orchestration event; do not feed to model context
                     return ""
                 # Fallback: collapse dict
-                return _json.dumps(data)[:2000]
+                return json.dumps(data)[:2000]
         except Exception:
             pass
         # Try to extract from stringified list-of-chunks like: [{'type':'text','text':'...'}, ...]
         try:
-            import re as _re2
             texts: List[str] = []
-            for m in _re2.finditer(r"(?:'text'|\"text\")\s*:\s*(?:'([^']*)'|\"([^\"]*)\")", s):
+            for m in _TEXT_FIELD_RE.finditer(s):
                 val = m.group(1) or m.group(2) or ""
                 if val:
                     texts.append(val)
@@ -208,11 +387,10 @@ def _extract_clean_text_for_faithfulness(content: Any) -> str:
                     return _extract_clean_text_for_faithfulness(parsed)
             except Exception:
                 # Fall back to regex extraction
-                import re
                 texts = []
-                for m in re.finditer(r"'text'\s*:\s*'([^']*(?:''[^']*)*)'", s):
+                for m in _SQ_TEXT_FIELD_RE.finditer(s):
                     texts.append(m.group(1).replace("''", "'"))
-                for m in re.finditer(r'"text"\s*:\s*"([^"]*(?:\\"[^"]*)*)"', s):
+                for m in _DQ_TEXT_FIELD_RE.finditer(s):
                     texts.append(m.group(1).replace('\\"', '"'))
                 if texts:
                     return "\n".join(texts).strip()
@@ -225,16 +403,20 @@ def _extract_clean_text_for_faithfulness(content: Any) -> str:
 
 def _build_agent_messages(usecase_id: Any, user_message: str) -> List[Dict[str, str]]:
     messages: List[Dict[str, str]] = []
+    current_user_message_found = False
     try:
-        with get_db_context() as db:
-            rec = db.query(UsecaseMetadata).filter(
-                UsecaseMetadata.usecase_id == usecase_id,
-                UsecaseMetadata.is_deleted == False,
-            ).first()
+        with get_db_readonly_context() as db:
+            # Only the two columns this builder reads, not the full ORM row
+            rec = db.execute(
+                select(UsecaseMetadata.chat_history, UsecaseMetadata.chat_summary).where(
+                    UsecaseMetadata.usecase_id == usecase_id,
+                    UsecaseMetadata.is_deleted == False,
+                )
+            ).one_or_none()
             if not rec:
                 return [{"role": "user", "content": user_message}]
             history = rec.chat_history or []
-            chat_summary = getattr(rec, "chat_summary", None)
+            chat_summary = rec.chat_summary
             # Determine if a summary marker exists; messages are stored newest-first
             marker_idx = None
             for i, entry in enumerate(history):
@@ -253,10 +435,8 @@ def _build_agent_messages(usecase_id: Any, user_message: str) -> List[Dict[str,
                 recent_portion = history[:marker_idx]
             else:
                 recent_portion = history
-            # Convert to chronological order
-            chronological = list(reversed(recent_portion))
-            current_user_message_found = False
-            for entry in chronological:
+            # Walk in chronological order without copying the list
+            for entry in reversed(recent_portion):
                 if isinstance(entry, dict) and "user" in entry:
                     content = str(entry.get("user") or "")[:4000]
                     # Check if this is the current user message (most recent one)
@@ -311,15 +491,15 @@ def _normalize_assistant_output(raw: Any) -> str:
             
         s = raw if isinstance(raw, str) else str(raw)
         s = s.strip()
+        if _is_plain_text(s):
+            return s
         original_s = s
         
         # Extract JSON user_answer
         try:
-            import re as _re
-            m = _re.search(r"```json\s*([\s\S]*?)\s*```", s, _re.IGNORECASE)
+            m = _CODE_FENCE_RE.search(s)
             s_try = m.group(1) if m else s
-            import json as _json
-            data = _json.loads(s_try)
+            data = json.loads(s_try)
             if isinstance(data, dict) and "user_answer" in data:
                 return str(data.get("user_answer") or "")
         except Exception:
@@ -327,9 +507,8 @@ def _normalize_assistant_output(raw: Any) -> str:
             
         # Extract from stringified chunk list (fallback for weird formats)
         try:
-            import re as _re2
             texts: List[str] = []
-            for mm in _re2.finditer(r"(?:'text'|\"text\")\s*:\s*(?:'([^']*)'|\"([^\"]*)\")", s):
+            for mm in _TEXT_FIELD_RE.finditer(s):
                 val = mm.group(1) or mm.group(2) or ""
                 if val:
                     texts.append(val)
@@ -349,10 +528,15 @@ def _normalize_assistant_output(raw: Any) -> str:
 
 
 def _log_agent_input(msgs: List[Dict[str, str]], *, label: str, usecase_id: Any) -> None:
+    if not _LOG_INPUT or not logger.isEnabledFor(logging.INFO):
+        return
     try:
         total = len(msgs)
-        chars = sum(len(m.get("content", "")) for m in msgs)
-        words = sum(len(m.get("content", "").split()) for m in msgs)
+        chars = words = 0
+        for m in msgs:
+            c = m.get("content", "")
+            chars += len(c)
+            words += len(c.split())
         header = f"\n\n=== AGENT INPUT [{label}] usecase={usecase_id} ===\nmessages={total} words={words} chars={chars}\n"
         # Preview first and last 3
         preview_lines: List[str] = []
@@ -377,6 +561,30 @@ def _log_agent_input(msgs: List[Dict[str, str]], *, label: str, usecase_id: Any)
         logger.warning(_color(f"[LOG-AGENT-INPUT] failed: {e}", "33"))
 
 
+def _log_tool_output(name: str, result: Any, truncated_suffix: str = "... [TRUNCATED]") -> None:
+    """Log a tool result as JSON capped at 5000 chars; serialized once and only when INFO is on."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    try:
+        out = orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
+        if len(out) > 5000:
+            out = out[:5000] + truncated_suffix
+        logger.info("%s[TOOL-OUTPUT %s] %s%s", _C34, name, out, _CRESET)
+    except Exception:
+        pass
+
+
+def _documents_log_view(docs: Dict[str, Any]) -> Dict[str, Any]:
+    """Log-only copy of a documents result: file metadata and lengths, no markdown bodies."""
+    view = {k: v for k, v in docs.items() if k not in ("combined_markdown", "files")}
+    view["files"] = [
+        {"file_id": f.get("file_id"), "file_name": f.get("file_name"), "markdown_len": len(f.get("markdown") or "")}
+        for f in docs.get("files", [])
+    ]
+    view["combined_markdown_len"] = len(docs.get("combined_markdown") or "")
+    return view
+
+
 def _format_tool_result_as_text(result: Dict[str, Any]) -> str:
     """Convert a tool result dictionary to a human-readable text string.
     
@@ -562,21 +770,42 @@ def _format_tool_result_as_text(result: Dict[str, Any]) -> str:
 
 
 # Tool implementations (thin wrappers)
+def _usecase_status_payload(rec: Any) -> Dict[str, Any]:
+    if not rec:
+        return {"error": "usecase_not_found"}
+    return {
+        "text_extraction": rec.text_extraction,
+        "requirement_generation": rec.requirement_generation,
+        "scenario_generation": rec.scenario_generation,
+        "test_case_generation": rec.test_case_generation,
+        "requirement_generation_confirmed": getattr(rec, "requirement_generation_confirmed", False),
+    }
+
+
+# Only the status columns, not the whole row (chat_history can be large)
+def _usecase_status_query(usecase_id):
+    return select(
+        UsecaseMetadata.text_extraction,
+        UsecaseMetadata.requirement_generation,
+        UsecaseMetadata.scenario_generation,
+        UsecaseMetadata.test_case_generation,
+        UsecaseMetadata.requirement_generation_confirmed,
+    ).where(
+        UsecaseMetadata.usecase_id == usecase_id,
+        UsecaseMetadata.is_deleted == False,
+    )
+
+
 def tool_get_usecase_status(usecase_id) -> Dict[str, Any]:
     with get_db_context() as db:
-        rec = db.query(UsecaseMetadata).filter(
-            UsecaseMetadata.usecase_id == usecase_id,
-            UsecaseMetadata.is_deleted == False,
-        ).first()
-        if not rec:
-            return {"error": "usecase_not_found"}
-        return {
-            "text_extraction": rec.text_extraction,
-            "requirement_generation": rec.requirement_generation,
-            "scenario_generation": rec.scenario_generation,
-            "test_case_generation": rec.test_case_generation,
-            "requirement_generation_confirmed": getattr(rec, "requirement_generation_confirmed", False),
-        }
+        rec = db.execute(_usecase_status_query(usecase_id)).one_or_none()
+        return _usecase_status_payload(rec)
+
+
+async def tool_get_usecase_status_async(usecase_id) -> Dict[str, Any]:
+    async with get_async_db_readonly_context() as db:
+        rec = (await db.execute(_usecase_status_query(usecase_id))).one_or_none()
+        return _usecase_status_payload(rec)
 
 
 def tool_check_text_extraction_status(file_id: str = None, usecase_id: UUID = None) -> Dict[str, Any]:
@@ -643,92 +872,111 @@ def tool_check_text_extraction_status(file_id: str = None, usecase_id: UUID = No
             return {"error": "missing_parameter", "message": "Either file_id or usecase_id must be provided"}
 
 
+# One row per file; pages are concatenated in page order by Postgres
+_DOCUMENTS_MARKDOWN_SQL = text(
+    """
+    SELECT f.file_id, f.file_name,
+           string_agg(COALESCE(o.page_text, '') || E'\\n', '' ORDER BY o.page_number) AS markdown
+    FROM file_metadata f
+    JOIN ocr_outputs o ON o.file_id = f.file_id
+    WHERE f.usecase_id = :uid AND o.is_deleted = false
+    GROUP BY f.file_id, f.file_name, f.created_at
+    ORDER BY f.created_at ASC
+    """
+)
+
+
+def _compose_documents_markdown(rows) -> Dict[str, Any]:
+    files = [
+        {"file_id": str(row.file_id), "file_name": row.file_name, "markdown": row.markdown or ""}
+        for row in rows
+    ]
+    combined = "\n".join(f"## {f['file_name']}\n\n{f['markdown'].strip()}\n" for f in files).strip()
+    logger.info("%s[DOC-READ] files=%s combined_chars=%s%s", _C34, len(files), len(combined), _CRESET)
+    return {"files": files, "combined_markdown": combined}
+
+
 def tool_get_documents_markdown(usecase_id) -> Dict[str, Any]:
     with get_db_context() as db:
-        outputs = db.query(OCROutputs).join(UsecaseMetadata, UsecaseMetadata.usecase_id == usecase_id).all()
-        # Minimal composition: collect all page_text for usecase's files
-        # Prefer page 1 semantics already enforced elsewhere
-        q = db.execute(
-            text(
-                """
-                SELECT f.file_id, f.file_name, o.page_number, o.page_text
-                FROM file_metadata f
-                JOIN ocr_outputs o ON o.file_id = f.file_id
-                WHERE f.usecase_id = :uid AND o.is_deleted = false
-                ORDER BY f.created_at ASC, o.page_number ASC
-                """
-            ),
-            {"uid": usecase_id},
-        ).fetchall()
-        files_map: Dict[str, Dict[str, Any]] = {}
-        for row in q:
-            fid = str(row.file_id)
-            if fid not in files_map:
-                files_map[fid] = {"file_id": fid, "file_name": row.file_name, "markdown": ""}
-            files_map[fid]["markdown"] += (row.page_text or "") + "\n"
-        files = list(files_map.values())
-        combined = "\n".join([f"## {f['file_name']}\n\n{f['markdown'].strip()}\n" for f in files]).strip()
-        logger.info(_color(f"[DOC-READ] files={len(files)} combined_chars={len(combined)}", "34"))
-        return {"files": files, "combined_markdown": combined}
+        q = db.execute(_DOCUMENTS_MARKDOWN_SQL, {"uid": usecase_id}).fetchall()
+        return _compose_documents_markdown(q)
+
+
+async def tool_get_documents_markdown_async(usecase_id) -> Dict[str, Any]:
+    async with get_async_db_readonly_context() as db:
+        q = (await db.execute(_DOCUMENTS_MARKDOWN_SQL, {"uid": usecase_id})).fetchall()
+        return _compose_documents_markdown(q)
+
+
+def _requirement_generation_gate(usecase_id, rec: Any) -> Dict[str, Any]:
+    text_extraction = rec.text_extraction or "Not Started"
+    requirement_generation = rec.requirement_generation or "Not Started"
+    confirmed = getattr(rec, "requirement_generation_confirmed", False)
+    
+    logger.info(_color(
+        f"[REQ-GEN] start requested for usecase={usecase_id} text_extraction={text_extraction} "
+        f"requirement_generation={requirement_generation} confirmed={confirmed}",
+        "34"
+    ))
+    
+    # Gate 1: Text extraction must be complete
+    if text_extraction != "Completed":
+        return {
+            "error": "precondition_not_met",
+            "message": f"Text extraction is '{text_extraction}'. Wait for document processing to complete.",
+            "text_extraction": text_extraction,
+            "requirement_generation": requirement_generation
+        }
+    
+    # Gate 2: Check requirement generation status
+    if requirement_generation == "In Progress":
+        return {
+            "status": "in_progress",
+            "message": "Requirement generation is already running. You'll be notified when complete."
+        }
+    
+    if requirement_generation == "Completed":
+        return {
+            "status": "already_completed",
+            "message": "Requirements already generated. You can view or query them now."
+        }
+    
+    if requirement_generation == "Failed" and confirmed:
+        return {
+            "status": "retry_allowed",
+            "message": "Previous generation failed. I can retry if you'd like."
+        }
+    
+    # Gate 3: Must be Not Started and not confirmed yet
+    if requirement_generation == "Not Started" and not confirmed:
+        return {
+            "status": "confirmation_required",
+            "message": "Ready to start requirement generation. Awaiting user confirmation."
+        }
+    
+    return {"error": "unexpected_state", "requirement_generation": requirement_generation, "confirmed": confirmed}
 
 
 def tool_start_requirement_generation(usecase_id) -> Dict[str, Any]:
     # Side-effect free: only indicate whether confirmation is required or already in progress/completed
     try:
         with get_db_context() as db:
-            rec = db.query(UsecaseMetadata).filter(
-                UsecaseMetadata.usecase_id == usecase_id,
-                UsecaseMetadata.is_deleted == False,
-            ).first()
+            rec = db.execute(_usecase_status_query(usecase_id)).one_or_none()
             if not rec:
                 return {"error": "usecase_not_found"}
-            
-            text_extraction = rec.text_extraction or "Not Started"
-            requirement_generation = rec.requirement_generation or "Not Started"
-            confirmed = getattr(rec, "requirement_generation_confirmed", False)
-            
-            logger.info(_color(
-                f"[REQ-GEN] start requested for usecase={usecase_id} text_extraction={text_extraction} "
-                f"requirement_generation={requirement_generation} confirmed={confirmed}",
-                "34"
-            ))
-            
-            # Gate 1: Text extraction must be complete
-            if text_extraction != "Completed":
-                return {
-                    "error": "precondition_not_met",
-                    "message": f"Text extraction is '{text_extraction}'. Wait for document processing to complete.",
-                    "text_extraction": text_extraction,
-                    "requirement_generation": requirement_generation
-                }
-            
-            # Gate 2: Check requirement generation status
-            if requirement_generation == "In Progress":
-                return {
-                    "status": "in_progress",
-                    "message": "Requirement generation is already running. You'll be notified when complete."
-                }
-            
-            if requirement_generation == "Completed":
-                return {
-                    "status": "already_completed",
-                    "message": "Requirements already generated. You can view or query them now."
-                }
-            
-            if requirement_generation == "Failed" and confirmed:
-                return {
-                    "status": "retry_allowed",
-                    "message": "Previous generation failed. I can retry if you'd like."
-                }
-            
-            # Gate 3: Must be Not Started and not confirmed yet
-            if requirement_generation == "Not Started" and not confirmed:
-                return {
-                    "status": "confirmation_required",
-                    "message": "Ready to start requirement generation. Awaiting user confirmation."
-                }
-            
-            return {"error": "unexpected_state", "requirement_generation": requirement_generation, "confirmed": confirmed}
+            return _requirement_generation_gate(usecase_id, rec)
+    except Exception as e:
+        logger.exception(_color(f"[REQ-GEN] tool error: {e}", "31"))
+        return {"error": "internal_error"}
+
+
+async def tool_start_requirement_generation_async(usecase_id) -> Dict[str, Any]:
+    try:
+        async with get_async_db_readonly_context() as db:
+            rec = (await db.execute(_usecase_status_query(usecase_id))).one_or_none()
+            if not rec:
+                return {"error": "usecase_not_found"}
+            return _requirement_generation_gate(usecase_id, rec)
     except Exception as e:
         logger.exception(_color(f"[REQ-GEN] tool error: {e}", "31"))
         return {"error": "internal_error"}
@@ -813,36 +1061,59 @@ def tool_start_scenario_generation(usecase_id: UUID) -> Dict[str, Any]:
         return {"error": "internal_error"}
 
 
+def _requirements_not_ready(uc: Any) -> Optional[Dict[str, Any]]:
+    if not uc:
+        return {"error": "usecase_not_found"}
+    
+    req_gen_status = uc.requirement_generation or "Not Started"
+    
+    if req_gen_status != "Completed":
+        return {
+            "error": "requirements_not_ready",
+            "requirement_generation": req_gen_status,
+            "message": f"Requirements are '{req_gen_status}'. "
+                      f"{'Generate them first.' if req_gen_status == 'Not Started' else 'Please wait for generation to complete.'}"
+        }
+    return None
+
+
+def _requirements_payload(payload: List[Any]) -> Dict[str, Any]:
+    logger.info("%s[REQ-READ] count=%s%s", _C34, len(payload), _CRESET)
+    return {
+        "requirements": payload,
+        "count": len(payload),
+        "message": f"Fetched {len(payload)} requirements for analysis."
+    }
+
+
 def tool_get_requirements(usecase_id) -> Dict[str, Any]:
     with get_db_context() as db:
-        uc = db.query(UsecaseMetadata).filter(
-            UsecaseMetadata.usecase_id == usecase_id,
-            UsecaseMetadata.is_deleted == False,
-        ).first()
-        if not uc:
-            return {"error": "usecase_not_found"}
-        
-        req_gen_status = uc.requirement_generation or "Not Started"
+        not_ready = _requirements_not_ready(db.execute(_usecase_status_query(usecase_id)).one_or_none())
+        if not_ready:
+            return not_ready
         
-        if req_gen_status != "Completed":
-            return {
-                "error": "requirements_not_ready",
-                "requirement_generation": req_gen_status,
-                "message": f"Requirements are '{req_gen_status}'. "
-                          f"{'Generate them first.' if req_gen_status == 'Not Started' else 'Please wait for generation to complete.'}"
-            }
+        reqs = db.execute(
+            select(Requirement.requirement_text).where(
+                Requirement.usecase_id == usecase_id,
+                Requirement.is_deleted == False,
+            )
+        ).scalars().all()
+        return _requirements_payload(list(reqs))
+
+
+async def tool_get_requirements_async(usecase_id) -> Dict[str, Any]:
+    async with get_async_db_readonly_context() as db:
+        not_ready = _requirements_not_ready((await db.execute(_usecase_status_query(usecase_id))).one_or_none())
+        if not_ready:
+            return not_ready
         
-        reqs = db.query(Requirement).filter(
-            Requirement.usecase_id == usecase_id,
-            Requirement.is_deleted == False,
-        ).all()
-        payload = [r.requirement_text for r in reqs]
-        logger.info(_color(f"[REQ-READ] count={len(payload)}", "34"))
-        return {
-            "requirements": payload,
-            "count": len(payload),
-            "message": f"Fetched {len(payload)} requirements for analysis."
-        }
+        result = await db.execute(
+            select(Requirement.requirement_text).where(
+                Requirement.usecase_id == usecase_id,
+                Requirement.is_deleted == False,
+            )
+        )
+        return _requirements_payload(list(result.scalars().all()))
 
 
 def tool_show_extracted_text(file_id: str = None, file_name: str = None, usecase_id: UUID = None) -> Dict[str, Any]:
@@ -1158,7 +1429,7 @@ def tool_show_scenarios(usecase_id: UUID) -> Dict[str, Any]:
     Only call when user asks to see/show scenarios.
     Similar to tool_show_requirements but for scenarios.
     """
-    logger.info(_color(f"[SHOW-SCENARIOS] Function called for usecase_id={usecase_id}", "36"))
+    logger.info("%s[SHOW-SCENARIOS] Function called for usecase_id=%s%s", _C36, usecase_id, _CRESET)
     with get_db_context() as db:
         # Verify usecase exists
         usecase = db.query(UsecaseMetadata).filter(
@@ -1741,7 +2012,7 @@ def tool_show_testcases(usecase_id: UUID) -> Dict[str, Any]:
     Only call when user asks to see/show test cases.
     Similar to tool_show_scenarios but for test cases.
     """
-    logger.info(_color(f"[SHOW-TESTCASES] Function called for usecase_id={usecase_id}", "36"))
+    logger.info("%s[SHOW-TESTCASES] Function called for usecase_id=%s%s", _C36, usecase_id, _CRESET)
     with get_db_context() as db:
         # Verify usecase exists
         usecase = db.query(UsecaseMetadata).filter(
@@ -2192,20 +2463,16 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "get_usecase_status"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
-            result = await asyncio.to_thread(tool_get_usecase_status, usecase_id)
+            result = tracer.cached_result((name,))
+            if result is None:
+                result = await tool_get_usecase_status_async(usecase_id)
+                tracer.cache_result((name,), result)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=str({k: result.get(k) for k in ["text_extraction", "requirement_generation", "scenario_generation", "test_case_generation"]}), duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2219,22 +2486,19 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "get_documents_markdown"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
-            result = await asyncio.to_thread(tool_get_documents_markdown, usecase_id)
+            result = tracer.cached_result((name,))
+            if result is None:
+                result = await tool_get_documents_markdown_async(usecase_id)
+                tracer.cache_result((name,), result)
             combined = result.get("combined_markdown", "")
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"files={len(result.get('files', []))}", duration_ms=duration_ms, chars_read=len(combined))
-            # Log full output (pretty JSON) before return with truncation
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms chars_read={len(combined)}", "34"))
+            # Combined markdown can be megabytes; only serialize when raw output logging is on
+            if _LOG_RAW and logger.isEnabledFor(logging.INFO):
+                _log_tool_output(name, _documents_log_view(result))
+            logger.info("%s[TOOL-END %s] duration=%sms chars_read=%s%s", _C34, name, duration_ms, len(combined), _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2263,20 +2527,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "start_requirement_generation"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
-            result = await asyncio.to_thread(tool_start_requirement_generation, usecase_id)
+            result = await tool_start_requirement_generation_async(usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=str(result), duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2305,20 +2562,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "start_scenario_generation"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_start_scenario_generation, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=str(result), duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2336,21 +2586,17 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "get_requirements"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
-            result = await asyncio.to_thread(tool_get_requirements, usecase_id)
+            result = tracer.cached_result((name,))
+            if result is None:
+                result = await tool_get_requirements_async(usecase_id)
+                tracer.cache_result((name,), result)
             count = len(result.get("requirements", []))
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"count={count}", duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms count={count}", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms count=%s%s", _C34, name, duration_ms, count, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2368,20 +2614,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "check_text_extraction_status"
         entry = tracer.start_tool(name, args_preview=f'{{"file_id": "{file_id if file_id else "usecase"}"}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] file_id={file_id} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] file_id=%s usecase_id=%s%s", _C34, name, file_id, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_check_text_extraction_status, file_id, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=str(result.get("text_extraction", "unknown")), duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2404,9 +2643,9 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         """
         name = "show_extracted_text"
         
-        # Extract file names from most recent user message if file_name not provided
-        extracted_file_name = file_name
-        if not extracted_file_name:
+        def _file_name_from_history() -> Optional[str]:
+            # Sync DB lookup and matching; run on a worker thread, off the shared agent loop
+            extracted_file_name = None
             try:
                 with get_db_context() as db:
                     usecase = db.query(UsecaseMetadata).filter(
@@ -2422,7 +2661,7 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
                             FileMetadata.is_deleted == False
                         ).all()
                         available_file_names = [f.file_name for f in available_files] if available_files else []
-                        
+                    
                         # Find most recent user message
                         for entry in usecase.chat_history:
                             if isinstance(entry, dict) and "user" in entry:
@@ -2434,13 +2673,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
                                     extracted_file_name = first_file.get("name", "")
                                     if extracted_file_name:
                                         break
-                                
+                            
                                 # Priority 2: Extract file name from user's text message
                                 if not extracted_file_name:
                                     user_text = str(entry.get("user", ""))
                                     user_text_lower = user_text.lower()
                                     import re
-                                    
+                                
                                     # Improved patterns to extract file names from user text
                                     # These patterns capture the file name/keywords before common suffixes
                                     patterns = [
@@ -2453,7 +2692,7 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
                                         # "look into Magic Submission" -> "Magic Submission"
                                         r"look\s+(?:into|at)\s+(?:this\s+)?(?:the\s+)?['\"]?([^'\"]+?)(?:\s+document|\s+file|\s+pdf|$)",
                                     ]
-                                    
+                                
                                     potential_names = []
                                     for pattern in patterns:
                                         matches = re.finditer(pattern, user_text_lower, re.IGNORECASE)
@@ -2463,69 +2702,68 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
                                             potential_name = re.sub(r'\b(?:the|a|an|this|that|document|file|pdf)\b', '', potential_name, flags=re.IGNORECASE).strip()
                                             if potential_name and len(potential_name) > 2:  # At least 3 characters
                                                 potential_names.append(potential_name)
-                                    
+                                
                                     # Try to match extracted names against available files
                                     for potential_name in potential_names:
                                         # First try exact match (case-insensitive)
                                         for file_name in available_file_names:
                                             if file_name.lower() == potential_name.lower():
                                                 extracted_file_name = file_name
-                                                logger.info(_color(f"[SHOW-EXTRACTED-TEXT] Exact match: '{potential_name}' -> '{extracted_file_name}'", "34"))
+                                                logger.info("%s[SHOW-EXTRACTED-TEXT] Exact match: '%s' -> '%s'%s", _C34, potential_name, extracted_file_name, _CRESET)
                                                 break
-                                        
+                                    
                                         if extracted_file_name:
                                             break
-                                        
+                                    
                                         # Then try partial match - check if potential_name words are in file_name
                                         potential_words = [w.strip() for w in re.split(r'[\s\-_]+', potential_name) if len(w.strip()) > 2]
                                         if potential_words:
                                             best_match = None
                                             best_match_score = 0
-                                            
+                                        
                                             for file_name in available_file_names:
                                                 file_name_lower = file_name.lower()
                                                 # Count how many words from potential_name are in file_name
                                                 match_count = sum(1 for word in potential_words if word.lower() in file_name_lower)
                                                 match_score = match_count / len(potential_words) if potential_words else 0
-                                                
+                                            
                                                 # Also check if potential_name is a significant substring
                                                 if potential_name.lower() in file_name_lower:
                                                     match_score += 0.5
-                                                
+                                            
                                                 if match_score > best_match_score and match_score >= 0.5:  # At least 50% match
                                                     best_match_score = match_score
                                                     best_match = file_name
-                                            
+                                        
                                             if best_match:
                                                 extracted_file_name = best_match
-                                                logger.info(_color(f"[SHOW-EXTRACTED-TEXT] Partial match: '{potential_name}' -> '{extracted_file_name}' (score: {best_match_score:.2f})", "34"))
+                                                logger.info("%s[SHOW-EXTRACTED-TEXT] Partial match: '%s' -> '%s' (score: %.2f)%s", _C34, potential_name, extracted_file_name, best_match_score, _CRESET)
                                                 break
-                                    
-                                    if not extracted_file_name and potential_names:
-                                        logger.info(_color(f"[SHOW-EXTRACTED-TEXT] Could not match extracted names {potential_names} against available files {available_file_names}", "33"))
                                 
+                                    if not extracted_file_name and potential_names:
+                                        logger.info("%s[SHOW-EXTRACTED-TEXT] Could not match extracted names %s against available files %s%s", _C33, potential_names, available_file_names, _CRESET)
+                            
                                 # Break after processing the most recent user message
                                 break
             except Exception as e:
                 logger.warning(_color(f"[SHOW-EXTRACTED-TEXT] Error extracting file name from history: {e}", "33"))
+            return extracted_file_name
+
+        # Extract file names from most recent user message if file_name not provided
+        extracted_file_name = file_name
+        if not extracted_file_name:
+            extracted_file_name = await asyncio.to_thread(_file_name_from_history)
         
         entry = tracer.start_tool(name, args_preview=f'{{"file_id": "{file_id if file_id else "auto"}", "file_name": "{extracted_file_name if extracted_file_name else "none"}"}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] file_id={file_id} file_name={extracted_file_name} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] file_id=%s file_name=%s usecase_id=%s%s", _C34, name, file_id, extracted_file_name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_show_extracted_text, file_id, extracted_file_name, usecase_id)
             file_name_str = result.get("file_name", "N/A")
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"file_id={file_id} file_name={file_name_str} status={result.get('status', 'unknown')}", duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2546,7 +2784,7 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "read_extracted_text"
         entry = tracer.start_tool(name, args_preview=f'{{"file_name": "{file_name}"}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] file_name={file_name} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] file_name=%s usecase_id=%s%s", _C34, name, file_name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_read_extracted_text, file_name, usecase_id)
             total_chars = result.get("total_chars", 0)
@@ -2555,17 +2793,9 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
             duration_ms = int((time.time() - start) * 1000)
             # Log truncated version for performance, but return full to agent
             tracer.finish_tool(entry, True, result_preview=f"file_name={file_name_str} pages={pages_count} chars={total_chars}", duration_ms=duration_ms, chars_read=total_chars)
-            try:
-                import json as _json
-                # Log truncated version
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED IN LOG]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-                logger.info(_color(f"[TOOL-OUTPUT {name}] NOTE: Logs truncated for performance, but agent receives FULL text ({total_chars} chars)", "33"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms pages={pages_count} chars={total_chars}", "34"))
+            _log_tool_output(name, result, truncated_suffix="... [TRUNCATED IN LOG]")
+            logger.info("%s[TOOL-OUTPUT %s] NOTE: Logs truncated for performance, but agent receives FULL text (%s chars)%s", _C33, name, total_chars, _CRESET)
+            logger.info("%s[TOOL-END %s] duration=%sms pages=%s chars=%s%s", _C34, name, duration_ms, pages_count, total_chars, _CRESET)
             # Return FULL result - no truncation for agent
             return _format_tool_result_as_text(result)
         except Exception as e:
@@ -2587,7 +2817,7 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "read_requirement"
         entry = tracer.start_tool(name, args_preview=f'{{"display_id": {display_id}}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] display_id={display_id} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] display_id=%s usecase_id=%s%s", _C34, name, display_id, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_read_requirement, usecase_id, display_id)
             total_chars = result.get("total_chars", 0)
@@ -2595,17 +2825,9 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
             duration_ms = int((time.time() - start) * 1000)
             # Log truncated version for performance, but return full to agent
             tracer.finish_tool(entry, True, result_preview=f"display_id={display_id} name={req_name} chars={total_chars}", duration_ms=duration_ms, chars_read=total_chars)
-            try:
-                import json as _json
-                # Log truncated version
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED IN LOG]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-                logger.info(_color(f"[TOOL-OUTPUT {name}] NOTE: Logs truncated for performance, but agent receives FULL text ({total_chars} chars)", "33"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms chars={total_chars}", "34"))
+            _log_tool_output(name, result, truncated_suffix="... [TRUNCATED IN LOG]")
+            logger.info("%s[TOOL-OUTPUT %s] NOTE: Logs truncated for performance, but agent receives FULL text (%s chars)%s", _C33, name, total_chars, _CRESET)
+            logger.info("%s[TOOL-END %s] duration=%sms chars=%s%s", _C34, name, duration_ms, total_chars, _CRESET)
             # Return FULL result - no truncation for agent
             return _format_tool_result_as_text(result)
         except Exception as e:
@@ -2627,7 +2849,7 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "read_scenario"
         entry = tracer.start_tool(name, args_preview=f'{{"display_id": {display_id}}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] display_id={display_id} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] display_id=%s usecase_id=%s%s", _C34, name, display_id, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_read_scenario, usecase_id, display_id)
             total_chars = result.get("total_chars", 0)
@@ -2635,17 +2857,9 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
             duration_ms = int((time.time() - start) * 1000)
             # Log truncated version for performance, but return full to agent
             tracer.finish_tool(entry, True, result_preview=f"display_id={display_id} name={scen_name} chars={total_chars}", duration_ms=duration_ms, chars_read=total_chars)
-            try:
-                import json as _json
-                # Log truncated version
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED IN LOG]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-                logger.info(_color(f"[TOOL-OUTPUT {name}] NOTE: Logs truncated for performance, but agent receives FULL text ({total_chars} chars)", "33"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms chars={total_chars}", "34"))
+            _log_tool_output(name, result, truncated_suffix="... [TRUNCATED IN LOG]")
+            logger.info("%s[TOOL-OUTPUT %s] NOTE: Logs truncated for performance, but agent receives FULL text (%s chars)%s", _C33, name, total_chars, _CRESET)
+            logger.info("%s[TOOL-END %s] duration=%sms chars=%s%s", _C34, name, duration_ms, total_chars, _CRESET)
             # Return FULL result - no truncation for agent
             return _format_tool_result_as_text(result)
         except Exception as e:
@@ -2669,20 +2883,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "show_requirements"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_show_requirements, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"usecase_id={usecase_id} status={result.get('status', 'unknown')}", duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2705,20 +2912,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "show_scenarios"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_show_scenarios, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"usecase_id={usecase_id} status={result.get('status', 'unknown')}", duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2747,20 +2947,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "start_testcase_generation"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_start_testcase_generation, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=str(result), duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2781,22 +2974,15 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "read_testcase"
         entry = tracer.start_tool(name, args_preview=f'{{"display_id": {display_id}}}')
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] display_id={display_id} usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] display_id=%s usecase_id=%s%s", _C34, name, display_id, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_read_testcase, usecase_id, display_id)
             total_chars = result.get("total_chars", 0)
             tc_title = result.get("test_case_json", {}).get("test case", "N/A")
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"display_id={display_id} title={tc_title} chars={total_chars}", duration_ms=duration_ms, chars_read=total_chars)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms chars={total_chars}", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms chars=%s%s", _C34, name, duration_ms, total_chars, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2819,20 +3005,13 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
         name = "show_testcases"
         entry = tracer.start_tool(name, args_preview="{}")
         start = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id, _CRESET)
         try:
             result = await asyncio.to_thread(tool_show_testcases, usecase_id)
             duration_ms = int((time.time() - start) * 1000)
             tracer.finish_tool(entry, True, result_preview=f"usecase_id={usecase_id} status={result.get('status', 'unknown')}", duration_ms=duration_ms)
-            try:
-                import json as _json
-                out = _json.dumps(result, ensure_ascii=False)[:5000]
-                if len(_json.dumps(result, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}] duration={duration_ms}ms", "34"))
+            _log_tool_output(name, result)
+            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, name, duration_ms, _CRESET)
             return _format_tool_result_as_text(result)
         except Exception as e:
             duration_ms = int((time.time() - start) * 1000)
@@ -2868,7 +3047,97 @@ def build_tools(usecase_id, tracer: TraceCollector, status: Dict[str, Any] = Non
     return all_tools, tool_map
 
 
-def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn_id: UUID | None = None) -> Tuple[str, Dict[str, Any]]:
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+# How long a timed-out turn gets to unwind (cancel in-flight awaits, flush traces) before the fallback runs
+_TURN_CANCEL_GRACE_S = 10
+
+
+def _agent_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived event loop shared by all agent turns.
+
+    Keeping one loop alive lets loop-bound resources (async DB pool, LLM HTTP clients)
+    be reused across turns instead of being rebuilt and torn down per message. Turns from
+    all users share it, so anything sync (DB sessions, model construction, matching over
+    chat history) must go through asyncio.to_thread rather than run on the loop.
+    """
+    global _LOOP
+    if _LOOP is None:
+        with _LOOP_LOCK:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="agent-loop", daemon=True).start()
+                _LOOP = loop
+    return _LOOP
+
+
+async def shutdown_agent_loop() -> None:
+    """Dispose the async DB pool on the agent loop that owns it, then stop the loop."""
+    global _LOOP
+    with _LOOP_LOCK:
+        loop, _LOOP = _LOOP, None
+    if loop is None:
+        return
+    try:
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(release_async_engine(), loop))
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+
+
+async def run_agent_turn_async(
+    usecase_id,
+    user_message: str,
+    model: str | None = None,
+    turn_id: UUID | None = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Awaitable wrapper around run_agent_turn for async callers.
+
+    run_agent_turn blocks until its turn finishes on the shared agent loop, so it must not
+    run on an event-loop thread; this hands it to a worker thread instead.
+    """
+    return await asyncio.to_thread(run_agent_turn, usecase_id, user_message, model, turn_id)
+
+
+async def run_agent_turn_batch(
+    requests: List[Tuple[Any, str]],
+    *,
+    model: str | None = None,
+    max_concurrency: int = 8,
+) -> List[Any]:
+    """Run independent agent turns concurrently, e.g. for dataset or evaluation workloads.
+
+    Args:
+        requests: (usecase_id, user_message) pairs
+        model: Optional model ID applied to every turn
+        max_concurrency: Upper bound on turns in flight, to stay within provider rate limits
+
+    Returns: (assistant_text, traces) per request, in input order; a turn that raised
+        yields its exception in place so one failure does not discard the rest
+    """
+    sem = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _one(usecase_id, user_message: str) -> Tuple[str, Dict[str, Any]]:
+        async with sem:
+            return await run_agent_turn_async(usecase_id, user_message, model=model)
+
+    return await asyncio.gather(*(_one(uid, msg) for uid, msg in requests), return_exceptions=True)
+
+
+def _requirement_generation_event(text_extraction: str, confirmed: bool, requirement_generation: str) -> Optional[str]:
+    """Return the requirement-generation system_event to surface after a turn, or None."""
+    if requirement_generation == "In Progress":
+        return "requirement_generation_in_progress"
+    if text_extraction == "Completed" and not confirmed and requirement_generation == "Not Started":
+        return "requirement_generation_confirmation_required"
+    return None
+
+
+def run_agent_turn(
+    usecase_id,
+    user_message: str,
+    model: str | None = None,
+    turn_id: UUID | None = None,
+) -> Tuple[str, Dict[str, Any]]:
     """
     Run a single agent turn. If deepagents is available, use it for planning/traces; otherwise fallback to a simple rule-based flow.
     
@@ -2881,15 +3150,11 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
     Returns: (assistant_text, traces)
     """
     tracer = TraceCollector()
+    usecase_id_str = str(usecase_id)
     
     # Pre-check: Detect requirement generation intent and ensure tool is called
     user_text_lower = user_message.lower()
-    requirement_generation_keywords = [
-        "generate requirements", "extract requirements", "create requirements", 
-        "requirements list", "generate requirement", "extract requirement",
-        "start requirement generation", "begin requirement generation"
-    ]
-    wants_requirement_generation = any(kw in user_text_lower for kw in requirement_generation_keywords)
+    wants_requirement_generation = any(kw in user_text_lower for kw in _REQ_GEN_KEYWORDS)
     
     if wants_requirement_generation:
         logger.info(_color(f"[REQ-GEN-PRECHECK] Detected requirement generation intent in user message", "35"))
@@ -2917,16 +3182,8 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
             logger.warning(_color(f"[REQ-GEN-PRECHECK] Pre-check failed: {e}", "33"))
     
     # Pre-check: Detect scenario generation intent and ensure tool is called
-    scenario_generation_keywords = [
-        "generate scenarios", "create scenarios", "generate test scenarios",
-        "scenario generation", "generate scenario", "create scenario",
-        "start scenario generation", "begin scenario generation",
-        "scenarios for these requirements", "scenarios for requirements",
-        "generate scanerios", "scanerios",  # Handle common typos
-        "scenario", "scenarios"  # More flexible matching
-    ]
     # More flexible matching: check if user message contains scenario-related words
-    wants_scenario_generation = any(kw in user_text_lower for kw in scenario_generation_keywords) or \
+    wants_scenario_generation = any(kw in user_text_lower for kw in _SCENARIO_GEN_KEYWORDS) or \
                                  ("scenario" in user_text_lower and ("generate" in user_text_lower or "create" in user_text_lower))
     
     # Get status BEFORE building tools for filtering and pre-checks
@@ -2964,14 +3221,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
             logger.warning(_color(f"[SCENARIO-GEN-PRECHECK] Pre-check failed: {e}", "33"))
     
     # Pre-check: Detect test case generation intent and ensure tool is called
-    testcase_generation_keywords = [
-        "generate test cases", "create test cases", "generate testcases",
-        "test case generation", "generate test case", "create test case",
-        "start test case generation", "begin test case generation",
-        "test cases for these scenarios", "test cases for scenarios",
-        "generate testcases", "testcases",  # Handle common typos
-    ]
-    wants_testcase_generation = any(kw in user_text_lower for kw in testcase_generation_keywords)
+    wants_testcase_generation = any(kw in user_text_lower for kw in _TESTCASE_GEN_KEYWORDS)
     
     if wants_testcase_generation:
         logger.info(_color(f"[TESTCASE-GEN-PRECHECK] Detected test case generation intent in user message", "35"))
@@ -3007,73 +3257,61 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
     # Build tools with status-based filtering
     tools, tool_map = build_tools(usecase_id, tracer, status=status)
 
-    # Helper to create fresh model instance for each event loop execution
+    # Model for this turn: resolved once and shared by the agent and faithfulness checks.
+    # Not cached across turns: the model carries the requesting user's API key.
+    turn_model: Dict[str, Any] = {}
+
     def _create_model_instance():
+        if "model" in turn_model:
+            return turn_model["model"]
+
         from core.model_registry import get_default_model, is_valid_model
-        from db.session import get_db_context
-        
-        target_model = model
-        if not target_model:
-            try:
-                with get_db_context() as db:
-                    from models.usecase.usecase import UsecaseMetadata
-                    rec = db.query(UsecaseMetadata).filter(
-                        UsecaseMetadata.usecase_id == usecase_id,
-                        UsecaseMetadata.is_deleted == False,
-                    ).first()
-                    if rec and rec.selected_model:
-                        target_model = rec.selected_model
-            except Exception:
-                pass
-        
-        if not target_model or not is_valid_model(target_model):
-            target_model = get_default_model()
-            
+        from services.llm.unified_invoker import get_chat_model_for_user, InvokerError
+
+        generated_model = None
         try:
-            from services.llm.unified_invoker import get_chat_model_for_user, InvokerError
-            
-            generated_model = None
-            try:
-                with get_db_context() as _db:
-                    from models.usecase.usecase import UsecaseMetadata
-                    _rec = _db.query(UsecaseMetadata).filter(
-                        UsecaseMetadata.usecase_id == usecase_id,
-                        UsecaseMetadata.is_deleted == False,
-                    ).first()
-                    if _rec:
-                        try:
-                            generated_model, provider, key_source = get_chat_model_for_user(
-                                user_id=_rec.user_id,
-                                model_id=target_model,
-                                db=_db,
-                                temperature=0.7,
-                                max_tokens=2048
-                            )
-                        except InvokerError as ie:
-                             raise ValueError(f"No API key configured: {ie}")
-            except ValueError:
-                raise
-            except Exception as _e:
-                raise ValueError(f"Failed to initialize LLM: {_e}")
-                
-            if generated_model is None:
-                raise ValueError("No LLM model available.")
-                
-            return generated_model
-        except Exception:
-             raise
-             
-    from deepagents import create_deep_agent
+            with get_db_context() as _db:
+                _rec = _db.query(UsecaseMetadata).filter(
+                    UsecaseMetadata.usecase_id == usecase_id,
+                    UsecaseMetadata.is_deleted == False,
+                ).first()
+                if _rec:
+                    target_model = model or _rec.selected_model
+                    if not target_model or not is_valid_model(target_model):
+                        target_model = get_default_model()
+                    try:
+                        generated_model, provider, key_source = get_chat_model_for_user(
+                            user_id=_rec.user_id,
+                            model_id=target_model,
+                            db=_db,
+                            temperature=0.7,
+                            max_tokens=2048
+                        )
+                    except InvokerError as ie:
+                         raise ValueError(f"No API key configured: {ie}")
+        except ValueError:
+            raise
+        except Exception as _e:
+            raise ValueError(f"Failed to initialize LLM: {_e}")
 
+        if generated_model is None:
+            raise ValueError("No LLM model available.")
 
+        turn_model["model"] = generated_model
+        return generated_model
 
-    # Build and possibly summarize chat history if extremely long (>200k words)
+
+    # Build and possibly summarize chat history if extremely long (>200k words).
+    # Summarization itself is awaited at the start of this turn's event loop (see _run_and_release).
+    summarize_history = None
     try:
-        with get_db_context() as _db:
-            rec = _db.query(UsecaseMetadata).filter(
-                UsecaseMetadata.usecase_id == usecase_id,
-                UsecaseMetadata.is_deleted == False,
-            ).first()
+        with get_db_readonly_context() as _db:
+            rec = _db.execute(
+                select(UsecaseMetadata.chat_history, UsecaseMetadata.chat_summary).where(
+                    UsecaseMetadata.usecase_id == usecase_id,
+                    UsecaseMetadata.is_deleted == False,
+                )
+            ).one_or_none()
             if rec:
                 hist = rec.chat_history or []
                 # Estimate words across user/system texts ignoring structured traces
@@ -3084,42 +3322,62 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         if "system" in e:
                             return _extract_assistant_text(e.get("system"))
                     return ""
-                total_words = 0
+                # Upper bound before splitting: each word costs at least two chars with its separator
+                # (plus one per entry), and extracted assistant text is capped at 4000 chars
+                char_bound = len(hist)
                 for e in hist:
-                    t = _entry_text(e)
-                    if t:
-                        total_words += len(t.split())
+                    if isinstance(e, dict):
+                        if "user" in e:
+                            char_bound += len(str(e.get("user") or ""))
+                        elif "system" in e:
+                            char_bound += 4000
+                total_words = 0
+                if char_bound > 400000:
+                    for e in hist:
+                        t = _entry_text(e)
+                        if t:
+                            total_words += len(t.split())
                 if total_words > 200000:
-                    # Use already-resolved GEMINI_API_KEY from BYOK system
-                    try:
-                        import asyncio as _asyncio
-                        context, updated_history, updated_summary, summarized = _asyncio.run(
-                            manage_chat_history_for_usecase(
-                                usecase_id=usecase_id,
-                                chat_history=hist,
-                                chat_summary=getattr(rec, "chat_summary", None),
-                                user_query=user_message,
-                                api_key="",  # Value not available in this scope, passing empty to let manager handle or fail safely
-                                db=_db,
-                                model_name="gemini-2.5-flash",
-                            )
-                        )
-                        # Values persisted inside manager; nothing else needed here
-                        logger.info(_color(f"[HISTORY] Summarized due to size words={total_words}", "34"))
-                    except Exception as _e:
-                        logger.warning(_color(f"[HISTORY] summarization failed: {_e}", "33"))
+                    summarize_history = {
+                        "chat_history": hist,
+                        "chat_summary": rec.chat_summary,
+                        "total_words": total_words,
+                    }
     except Exception:
         pass
 
+    def _summarize_history_sync() -> None:
+        # Runs on a worker thread: the manager works against a sync session and commits,
+        # so it gets that thread's own loop rather than blocking the shared agent loop
+        with get_db_context() as _db:
+            asyncio.run(manage_chat_history_for_usecase(
+                usecase_id=usecase_id,
+                chat_history=summarize_history["chat_history"],
+                chat_summary=summarize_history["chat_summary"],
+                user_query=user_message,
+                api_key="",  # Value not available in this scope, passing empty to let manager handle or fail safely
+                db=_db,
+                model_name="gemini-2.5-flash",
+            ))
+
+    async def _summarize_history_if_needed() -> None:
+        if not summarize_history:
+            return
+        # Use already-resolved GEMINI_API_KEY from BYOK system
+        try:
+            await asyncio.to_thread(_summarize_history_sync)
+            # Values persisted inside manager; nothing else needed here
+            logger.info("%s[HISTORY] Summarized due to size words=%s%s", _C34, summarize_history['total_words'], _CRESET)
+        except Exception as _e:
+            logger.warning(_color(f"[HISTORY] summarization failed: {_e}", "33"))
+
     # Prefer file-based prompt if provided to ease multiline editing
     sys_prompt_file = get_env_variable("AGENT_SYSTEM_PROMPT_FILE", "").strip()
     system_prompt_value = None
     if sys_prompt_file:
         try:
-            import os as _os
-            if _os.path.exists(sys_prompt_file):
-                with open(sys_prompt_file, "r", encoding="utf-8") as f:
-                    system_prompt_value = f.read()
+            if os.path.exists(sys_prompt_file):
+                system_prompt_value = _read_prompt_file(sys_prompt_file, os.stat(sys_prompt_file).st_mtime_ns)
         except Exception:
             system_prompt_value = None
     if not system_prompt_value:
@@ -3156,10 +3414,30 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         except Exception:
             pass
 
+    # Status snapshot for the post-run modal/fallback checks. It is read asynchronously once the
+    # agent's tools have run, overlapping the faithfulness LLM call instead of following it.
+    post_run: Dict[str, Any] = {}
+
+    async def _prefetch_post_run_rec() -> None:
+        try:
+            async with get_async_db_readonly_context() as db:
+                post_run["rec"] = (await db.execute(_usecase_status_query(usecase_id))).one_or_none()
+        except Exception as _e:
+            post_run.pop("rec", None)
+            logger.warning(_color(f"[POST-RUN] status prefetch failed: {_e}", "33"))
+
+    def _post_run_rec():
+        if "rec" not in post_run:
+            with get_db_readonly_context() as db:
+                post_run["rec"] = db.execute(_usecase_status_query(usecase_id)).one_or_none()
+        return post_run["rec"]
+
+    # Set when a timed-out turn is still unwinding on the agent loop and may keep writing to tracer
+    turn_abandoned = False
     try:
         async def _run(current_message: str) -> str:
-            # Create fresh model and agent for this execution loop
-            lc_model = _create_model_instance()
+            # Create agent for this execution loop
+            lc_model = await asyncio.to_thread(_create_model_instance)
 
             # --- FAITHFULNESS TOOL INJECTION ---
             faithfulness_agent = FaithfulnessAgent()
@@ -3177,11 +3455,10 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                 Returns:
                     JSON with score (0-100), is_faithful (bool), and reason.
                 """
-                # Use fresh model for check (avoids event loop issues)
                 faith_model = _create_model_instance()
                 
                 # Trace start
-                f_args = json.dumps({"action": "evaluate", "response_preview": draft_answer[:50]})
+                f_args = orjson.dumps({"action": "evaluate", "response_preview": draft_answer[:50]}).decode()
                 trace_entry = tracer.start_tool("check_faithfulness", f_args)
                 
                 try:
@@ -3191,7 +3468,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                     tracer.finish_tool(
                         trace_entry, 
                         ok=True, 
-                        result_preview=json.dumps(result)
+                        result_preview=orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
                     )
                     
                     # Return Directive String to Agent (not raw JSON)
@@ -3220,8 +3497,10 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
             
             # Debug: Confirm tools passed to agent
             tool_names_debug = [getattr(t, "name", str(t)) for t in local_tools]
-            logger.info(_color(f"[DEBUG-TOOLS] Registered tools for agent: {tool_names_debug}", "36"))
+            logger.info("%s[DEBUG-TOOLS] Registered tools for agent: %s%s", _C36, tool_names_debug, _CRESET)
 
+            if create_deep_agent is None:
+                raise ImportError("deepagents is not installed")
             agent = create_deep_agent(
                 tools=local_tools,
                 model=lc_model,
@@ -3233,7 +3512,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
             # --- FAITHFULNESS COMPLIANCE LOOP ---
             # Run agent, then check faithfulness. Retry until faithful or max attempts.
             max_check_attempts = 3
-            current_msgs = _build_agent_messages(usecase_id, current_message)
+            current_msgs = await asyncio.to_thread(_build_agent_messages, usecase_id, current_message)
             _log_agent_input(current_msgs, label="faithfulness_loop:init", usecase_id=usecase_id)
             
             # Trace step tracker to ensure continuous numbering across retries
@@ -3248,6 +3527,12 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                     # Track latest messages from this run to preserve context (tool calls, etc.)
                     latest_run_messages = []
                     
+                    # Content accessor is bound on the first message so each chunk is a single call
+                    get_content = None
+                    # values mode re-sends the full state each step; only the newest content is kept
+                    # and stringified once after the stream ends
+                    last_content = None
+
                     # Run Agent
                     async for chunk in agent.astream(
                         {"messages": current_msgs},
@@ -3259,24 +3544,34 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                             if isinstance(msgs, list) and msgs:
                                 latest_run_messages = msgs
                                 last = msgs[-1]
-                                content = getattr(last, "content", None) or (last.get("content") if isinstance(last, dict) else None)
+                                if get_content is None:
+                                    get_content = _dict_content if isinstance(last, dict) else _attr_content
+                                content = get_content(last)
                                 if content:
-                                    final_text = str(content)
+                                    last_content = content
+                    if last_content:
+                        final_text = str(last_content)
                     
                     # Update offset for next attempt if needed
                     current_step_offset = db_callback.step_counter
+
+                    # This pass's tools are done; refresh the post-run status while faithfulness is checked
+                    prev_task = post_run.get("task")
+                    if prev_task is not None:
+                        prev_task.cancel()
+                    post_run["task"] = asyncio.create_task(_prefetch_post_run_rec())
                     
                     # Update current_msgs to reflect the actual conversation state
                     if latest_run_messages:
                         current_msgs = latest_run_messages
                     
                     # Log raw output
-                    if AgentLogConfigs.LOG_AGENT_RAW_OUTPUT:
+                    if _LOG_RAW and logger.isEnabledFor(logging.INFO):
                         try:
                             txt = final_text or ""
-                            if len(txt) > AgentLogConfigs.LOG_AGENT_RAW_OUTPUT_MAX_LENGTH:
-                                txt = txt[:AgentLogConfigs.LOG_AGENT_RAW_OUTPUT_MAX_LENGTH] + "..."
-                            logger.info("\033[33m[AGENT RAW OUTPUT (Pass %d)]\n%s\033[0m", attempt_idx+1, txt)
+                            if len(txt) > _LOG_RAW_MAX:
+                                txt = txt[:_LOG_RAW_MAX] + "..."
+                            logger.info("%s[AGENT RAW OUTPUT (Pass %d)]\n%s%s", _C33, attempt_idx+1, txt, _CRESET)
                         except Exception:
                             pass
 
@@ -3286,34 +3581,29 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                     clean_response_text = _extract_clean_text_for_faithfulness(final_text)
                     
                     # Include the clean agent response in trace input for visibility
-                    faith_input = json.dumps({
+                    faith_input = orjson.dumps({
                         "attempt": attempt_idx + 1,
                         "agent_response": clean_response_text or "(empty response)"
-                    })
+                    }).decode()
                     faith_trace = tracer.start_tool("faithfulness_check", faith_input)
                     
                     # Also log to database for ThinkingStream visibility
                     current_step_offset += 1
                     try:
-                        with get_db_context() as faith_db:
-                            from models.agent.trace import AgentTrace
-                            import uuid as uuid_mod
-                            faith_start_trace = AgentTrace(
-                                usecase_id=usecase_id,
-                                turn_id=turn_id,
-                                run_id=uuid_mod.uuid4(),
-                                step_number=current_step_offset,
-                                step_type="tool_start",
-                                content={"input": faith_input, "tool": "faithfulness_check"},
-                                metadata_={"tool_name": "faithfulness_check"},
-                            )
-                            faith_db.add(faith_start_trace)
-                            faith_db.commit()
+                        enqueue_trace({
+                            "usecase_id": usecase_id,
+                            "turn_id": turn_id,
+                            "run_id": uuid.uuid4(),
+                            "step_number": current_step_offset,
+                            "step_type": "tool_start",
+                            "content": {"input": faith_input, "tool": "faithfulness_check"},
+                            "metadata_": {"tool_name": "faithfulness_check"},
+                        })
                     except Exception as db_err:
                         logger.warning(f"[DB-TRACE] Failed to log faithfulness start: {db_err}")
                     
                     try:
-                        faith_model = _create_model_instance()
+                        faith_model = await asyncio.to_thread(_create_model_instance)
                         
                         # Build conversation context from recent messages (last 5 exchanges)
                         context_parts = []
@@ -3332,7 +3622,8 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         
                         conversation_context = "\n".join(context_parts) if context_parts else None
                         
-                        faith_result = faithfulness_agent.evaluate(
+                        faith_result = await asyncio.to_thread(
+                            faithfulness_agent.evaluate,
                             current_message, 
                             clean_response_text, 
                             llm=faith_model,
@@ -3347,30 +3638,25 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Use ok=is_faithful so failed checks show as errors in UI
                         result_text = f"Score: {score}/100 | Faithful: {is_faithful} | Reason: {reason}"
                         tracer.finish_tool(faith_trace, ok=is_faithful, result_preview=result_text)
-                        logger.info(_color(f"[FAITHFULNESS] Pass {attempt_idx+1}: {result_text}", "36"))
+                        logger.info("%s[FAITHFULNESS] Pass %s: %s%s", _C36, attempt_idx + 1, result_text, _CRESET)
                         
                         # Log tool_end to database
                         current_step_offset += 1
                         try:
-                            with get_db_context() as faith_db:
-                                from models.agent.trace import AgentTrace
-                                import uuid as uuid_mod
-                                faith_end_trace = AgentTrace(
-                                    usecase_id=usecase_id,
-                                    turn_id=turn_id,
-                                    run_id=uuid_mod.uuid4(),
-                                    step_number=current_step_offset,
-                                    step_type="tool_end" if is_faithful else "error",
-                                    content={"output": result_text},
-                                    metadata_={"tool_name": "faithfulness_check", "is_faithful": is_faithful, "score": score},
-                                )
-                                faith_db.add(faith_end_trace)
-                                faith_db.commit()
+                            enqueue_trace({
+                                "usecase_id": usecase_id,
+                                "turn_id": turn_id,
+                                "run_id": uuid.uuid4(),
+                                "step_number": current_step_offset,
+                                "step_type": "tool_end" if is_faithful else "error",
+                                "content": {"output": result_text},
+                                "metadata_": {"tool_name": "faithfulness_check", "is_faithful": is_faithful, "score": score},
+                            })
                         except Exception as db_err:
                             logger.warning(f"[DB-TRACE] Failed to log faithfulness end: {db_err}")
                         
                         if is_faithful:
-                            logger.info(_color(f"[FAITHFULNESS] Response verified as faithful on pass {attempt_idx+1}", "32"))
+                            logger.info("%s[FAITHFULNESS] Response verified as faithful on pass %s%s", _C32, attempt_idx + 1, _CRESET)
                             break
                         else:
                             if attempt_idx < max_check_attempts - 1:
@@ -3396,28 +3682,52 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                     # On catastrophic error, just break and return whatever we have
                     break
 
-            final_text_norm = _normalize_assistant_output(final_text)
-            tracer.set_assistant_final(final_text_norm)
-            logger.info(_color(f"[AGENT]\n\n{final_text_norm}\n", "32"))
-            return final_text_norm
+            return final_text
+
+        turn_settled = threading.Event()
+
+        async def _run_turn(current_message: str) -> str:
+            try:
+                try:
+                    await _summarize_history_if_needed()
+                    return await _run(current_message)
+                finally:
+                    prefetch = post_run.pop("task", None)
+                    if prefetch is not None:
+                        try:
+                            await prefetch
+                        except asyncio.CancelledError:
+                            post_run.pop("rec", None)
+                    # Make this turn's thinking traces durable before the response is returned
+                    await asyncio.to_thread(flush_traces)
+            finally:
+                turn_settled.set()
 
         # Execution - Single attempt, self-corrected by tool usage
-        assistant_text = asyncio.run(_run(user_message))
+        turn_future = asyncio.run_coroutine_threadsafe(_run_turn(user_message), _agent_loop())
+        try:
+            final_text = turn_future.result(timeout=AgentRuntimeConfigs.TURN_TIMEOUT_S)
+        except concurrent.futures.TimeoutError:
+            # Cancel the coroutine on the shared loop and give it a grace period to unwind
+            # before the fallback runs
+            turn_future.cancel()
+            turn_abandoned = not turn_settled.wait(_TURN_CANCEL_GRACE_S)
+            raise TimeoutError(f"Agent turn exceeded {AgentRuntimeConfigs.TURN_TIMEOUT_S}s")
+        assistant_text = _normalize_assistant_output(final_text)
+        logger.info("%s[AGENT]\n\n%s\n%s", _C32, assistant_text, _CRESET)
                 
         # Debug: Log all tool calls for scenario generation debugging
         try:
             all_tool_calls = tracer.data.get("tool_calls", [])
             tool_names = [tc.get("name") for tc in all_tool_calls]
-            logger.info(_color(f"[DEBUG] All tool calls: {tool_names}", "36"))
+            logger.info("%s[DEBUG] All tool calls: %s%s", _C36, tool_names, _CRESET)
         except Exception:
             pass
             pass
         
         # Post-run: if agent invoked start_requirement_generation, emit UI confirmation event
         try:
-            tool_called = any(
-                (tc.get("name") == "start_requirement_generation") for tc in tracer.data.get("tool_calls", [])
-            )
+            tool_called = tracer.was_called("start_requirement_generation")
         except Exception:
             tool_called = False
         
@@ -3425,12 +3735,12 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         if not tool_called and wants_requirement_generation:
             logger.info(_color(f"[REQ-GEN-FALLBACK] Tool was not called but user requested requirement generation - checking status", "35"))
             try:
-                status_check = tool_get_usecase_status(usecase_id)
+                status_check = _usecase_status_payload(_post_run_rec())
                 text_extraction = status_check.get("text_extraction") or "Not Started"
                 requirement_generation = status_check.get("requirement_generation") or "Not Started"
                 confirmed = status_check.get("requirement_generation_confirmed", False)
                 
-                logger.info(_color(f"[REQ-GEN-FALLBACK] Status check: text_extraction={text_extraction}, requirement_generation={requirement_generation}, confirmed={confirmed}", "35"))
+                logger.info("%s[REQ-GEN-FALLBACK] Status check: text_extraction=%s, requirement_generation=%s, confirmed=%s%s", _C35, text_extraction, requirement_generation, confirmed, _CRESET)
                 
                 if text_extraction == "Completed" and requirement_generation == "Not Started" and not confirmed:
                     logger.info(_color(f"[REQ-GEN-FALLBACK] Conditions met - calling start_requirement_generation tool as fallback", "35"))
@@ -3441,15 +3751,15 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id} (FALLBACK)", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s (FALLBACK)%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         # Call the synchronous tool function
                         result = tool_start_requirement_generation(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "confirmation_required":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[REQ-GEN-FALLBACK] Successfully called start_requirement_generation tool", "35"))
                             tool_called = True  # Now actually called
                         else:
@@ -3463,7 +3773,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                             tracer.finish_tool(tool_entry, False, error=str(e), duration_ms=duration_ms)
                         logger.warning(_color(f"[REQ-GEN-FALLBACK] Error calling start_requirement_generation: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[REQ-GEN-FALLBACK] Conditions not met: text_extraction={text_extraction}, requirement_generation={requirement_generation}, confirmed={confirmed}", "35"))
+                    logger.info("%s[REQ-GEN-FALLBACK] Conditions not met: text_extraction=%s, requirement_generation=%s, confirmed=%s%s", _C35, text_extraction, requirement_generation, confirmed, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[REQ-GEN-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
@@ -3473,64 +3783,43 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                 # Ensure UsecaseMetadata is imported
                 from models.usecase.usecase import UsecaseMetadata
                 
-                with get_db_context() as db:
-                    rec = db.query(UsecaseMetadata).filter(
-                        UsecaseMetadata.usecase_id == usecase_id,
-                        UsecaseMetadata.is_deleted == False,
-                    ).first()
-                    if rec:
-                        confirmed = getattr(rec, "requirement_generation_confirmed", False)
-                        status_rg = rec.requirement_generation or "Not Started"
-                        text_ext = rec.text_extraction or "Not Started"
-                        
+                rec = _post_run_rec()
+                if rec:
+                    confirmed = getattr(rec, "requirement_generation_confirmed", False)
+                    status_rg = rec.requirement_generation or "Not Started"
+                    text_ext = rec.text_extraction or "Not Started"
+                    
+                    logger.info(_color(
+                        f"[REQ-GEN-MODAL] Status check: text_extraction={text_ext}, "
+                        f"requirement_generation={status_rg}, confirmed={confirmed}",
+                        "35"
+                    ))
+                    
+                    # Only emit if conditions are right
+                    event = _requirement_generation_event(text_ext, confirmed, status_rg)
+                    if event:
+                        logger.info("%s[REQ-GEN-MODAL] Emitting %s event%s", _C35, event, _CRESET)
+                        assistant_text = orjson.dumps({
+                            "system_event": event,
+                            "usecase_id": usecase_id_str,
+                        }).decode()
+                    else:
                         logger.info(_color(
-                            f"[REQ-GEN-MODAL] Status check: text_extraction={text_ext}, "
-                            f"requirement_generation={status_rg}, confirmed={confirmed}",
+                            f"[REQ-GEN-MODAL] Conditions not met for event emission; keeping agent response",
                             "35"
                         ))
-                        
-                        # Only emit if conditions are right
-                        if text_ext == "Completed" and not confirmed and status_rg == "Not Started":
-                            logger.info(_color(f"[REQ-GEN-MODAL] Emitting confirmation_required event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "requirement_generation_confirmation_required",
-                                "usecase_id": str(usecase_id),
-                            })
-                        elif status_rg == "In Progress":
-                            logger.info(_color(f"[REQ-GEN-MODAL] Generation in progress; emitting in_progress event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "requirement_generation_in_progress",
-                                "usecase_id": str(usecase_id),
-                            })
-                        else:
-                            logger.info(_color(
-                                f"[REQ-GEN-MODAL] Conditions not met for event emission; keeping agent response",
-                                "35"
-                            ))
-                    else:
-                        logger.warning(_color(f"[REQ-GEN-MODAL] Usecase not found: {usecase_id}", "33"))
+                else:
+                    logger.warning(_color(f"[REQ-GEN-MODAL] Usecase not found: {usecase_id}", "33"))
             except Exception as e:
                 logger.warning(_color(f"[REQ-GEN-MODAL] Event emission failed: {e}", "33"), exc_info=True)
         
         # Post-run: if agent invoked start_scenario_generation, emit UI confirmation event
-        # Re-check user message for scenario generation intent (in case pre-check missed it)
-        user_text_lower_post = user_message.lower()
-        scenario_generation_keywords_post = [
-            "generate scenarios", "create scenarios", "generate test scenarios",
-            "scenario generation", "generate scenario", "create scenario",
-            "start scenario generation", "begin scenario generation",
-            "scenarios for these requirements", "scenarios for requirements",
-            "generate scanerios", "scanerios",  # Handle common typos
-            "scenario", "scenarios"  # More flexible matching
-        ]
-        wants_scenario_generation_post = any(kw in user_text_lower_post for kw in scenario_generation_keywords_post) or \
-                                         ("scenario" in user_text_lower_post and ("generate" in user_text_lower_post or "create" in user_text_lower_post))
+        # Same message and phrase table as the pre-check, so its result is reused rather than rescanned
+        wants_scenario_generation_post = wants_scenario_generation
         
         try:
-            scenario_tool_called = any(
-                (tc.get("name") == "start_scenario_generation") for tc in tracer.data.get("tool_calls", [])
-            )
-            logger.info(_color(f"[SCENARIO-GEN-CHECK] Tool call detection: scenario_tool_called={scenario_tool_called}, wants_scenario_generation={wants_scenario_generation}, wants_scenario_generation_post={wants_scenario_generation_post}, tool_calls_count={len(tracer.data.get('tool_calls', []))}", "35"))
+            scenario_tool_called = tracer.was_called("start_scenario_generation")
+            logger.info("%s[SCENARIO-GEN-CHECK] Tool call detection: scenario_tool_called=%s, wants_scenario_generation=%s, wants_scenario_generation_post=%s, tool_calls_count=%s%s", _C35, scenario_tool_called, wants_scenario_generation, wants_scenario_generation_post, len(tracer.data.get('tool_calls', [])), _CRESET)
         except Exception as e:
             scenario_tool_called = False
             logger.warning(_color(f"[SCENARIO-GEN-CHECK] Error checking tool calls: {e}", "33"))
@@ -3543,13 +3832,13 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         agent_response_suggests_scenario_gen = "scenario generation" in assistant_text.lower() or "confirmation modal" in assistant_text.lower()
         
         if not scenario_tool_called and (final_wants_scenario_generation or agent_response_suggests_scenario_gen):
-            logger.info(_color(f"[SCENARIO-GEN-FALLBACK] Tool was not called but user requested scenario generation (user_message='{user_message[:100]}', agent_response_suggests={agent_response_suggests_scenario_gen}) - checking status", "35"))
+            logger.info("%s[SCENARIO-GEN-FALLBACK] Tool was not called but user requested scenario generation (user_message='%s', agent_response_suggests=%s) - checking status%s", _C35, user_message[:100], agent_response_suggests_scenario_gen, _CRESET)
             try:
-                status_check = tool_get_usecase_status(usecase_id)
+                status_check = _usecase_status_payload(_post_run_rec())
                 requirement_generation = status_check.get("requirement_generation") or "Not Started"
                 scenario_generation = status_check.get("scenario_generation") or "Not Started"
                 
-                logger.info(_color(f"[SCENARIO-GEN-FALLBACK] Status check: requirement_generation={requirement_generation}, scenario_generation={scenario_generation}", "35"))
+                logger.info("%s[SCENARIO-GEN-FALLBACK] Status check: requirement_generation=%s, scenario_generation=%s%s", _C35, requirement_generation, scenario_generation, _CRESET)
                 
                 if requirement_generation == "Completed" and scenario_generation == "Not Started":
                     logger.info(_color(f"[SCENARIO-GEN-FALLBACK] Conditions met - calling start_scenario_generation tool as fallback", "35"))
@@ -3560,15 +3849,15 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id}", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         # Call the synchronous tool function
                         result = tool_start_scenario_generation(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "confirmation_required":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[SCENARIO-GEN-FALLBACK] Successfully called start_scenario_generation tool", "35"))
                             scenario_tool_called = True  # Now actually called
                         else:
@@ -3582,7 +3871,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                             tracer.finish_tool(tool_entry, False, error=str(e), duration_ms=duration_ms)
                         logger.warning(_color(f"[SCENARIO-GEN-FALLBACK] Error calling start_scenario_generation: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[SCENARIO-GEN-FALLBACK] Conditions not met: requirement_generation={requirement_generation}, scenario_generation={scenario_generation}", "35"))
+                    logger.info("%s[SCENARIO-GEN-FALLBACK] Conditions not met: requirement_generation=%s, scenario_generation=%s%s", _C35, requirement_generation, scenario_generation, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[SCENARIO-GEN-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
@@ -3592,59 +3881,45 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                 # Ensure UsecaseMetadata is imported
                 from models.usecase.usecase import UsecaseMetadata
                 
-                with get_db_context() as db:
-                    rec = db.query(UsecaseMetadata).filter(
-                        UsecaseMetadata.usecase_id == usecase_id,
-                        UsecaseMetadata.is_deleted == False,
-                    ).first()
-                    if rec:
-                        requirement_generation = rec.requirement_generation or "Not Started"
-                        scenario_generation = rec.scenario_generation or "Not Started"
-                        
+                rec = _post_run_rec()
+                if rec:
+                    requirement_generation = rec.requirement_generation or "Not Started"
+                    scenario_generation = rec.scenario_generation or "Not Started"
+                    
+                    logger.info(_color(
+                        f"[SCENARIO-GEN-MODAL] Status check: requirement_generation={requirement_generation}, "
+                        f"scenario_generation={scenario_generation}",
+                        "35"
+                    ))
+                    
+                    # Only emit if conditions are right
+                    if requirement_generation == "Completed" and scenario_generation == "Not Started":
+                        logger.info(_color(f"[SCENARIO-GEN-MODAL] Emitting confirmation_required event", "35"))
+                        assistant_text = orjson.dumps({
+                            "system_event": "scenario_generation_confirmation_required",
+                            "usecase_id": usecase_id_str,
+                        }).decode()
+                    elif scenario_generation == "In Progress":
+                        logger.info(_color(f"[SCENARIO-GEN-MODAL] Generation in progress; emitting in_progress event", "35"))
+                        assistant_text = orjson.dumps({
+                            "system_event": "scenario_generation_in_progress",
+                            "usecase_id": usecase_id_str,
+                        }).decode()
+                    else:
                         logger.info(_color(
-                            f"[SCENARIO-GEN-MODAL] Status check: requirement_generation={requirement_generation}, "
-                            f"scenario_generation={scenario_generation}",
+                            f"[SCENARIO-GEN-MODAL] Conditions not met for event emission; keeping agent response",
                             "35"
                         ))
-                        
-                        # Only emit if conditions are right
-                        if requirement_generation == "Completed" and scenario_generation == "Not Started":
-                            logger.info(_color(f"[SCENARIO-GEN-MODAL] Emitting confirmation_required event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "scenario_generation_confirmation_required",
-                                "usecase_id": str(usecase_id),
-                            })
-                        elif scenario_generation == "In Progress":
-                            logger.info(_color(f"[SCENARIO-GEN-MODAL] Generation in progress; emitting in_progress event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "scenario_generation_in_progress",
-                                "usecase_id": str(usecase_id),
-                            })
-                        else:
-                            logger.info(_color(
-                                f"[SCENARIO-GEN-MODAL] Conditions not met for event emission; keeping agent response",
-                                "35"
-                            ))
             except Exception as e:
                 logger.warning(_color(f"[SCENARIO-GEN-MODAL] Event emission failed: {e}", "33"))
         
         # Post-run: if agent invoked start_testcase_generation, emit UI confirmation event
-        # Re-check user message for test case generation intent (in case pre-check missed it)
-        user_text_lower_post_tc = user_message.lower()
-        testcase_generation_keywords_post = [
-            "generate test cases", "create test cases", "generate testcases",
-            "test case generation", "generate test case", "create test case",
-            "start test case generation", "begin test case generation",
-            "test cases for these scenarios", "test cases for scenarios",
-            "generate testcases", "testcases",  # Handle common typos
-        ]
-        wants_testcase_generation_post = any(kw in user_text_lower_post_tc for kw in testcase_generation_keywords_post)
+        # Same message and phrase table as the pre-check, so its result is reused rather than rescanned
+        wants_testcase_generation_post = wants_testcase_generation
         
         try:
-            testcase_tool_called = any(
-                (tc.get("name") == "start_testcase_generation") for tc in tracer.data.get("tool_calls", [])
-            )
-            logger.info(_color(f"[TESTCASE-GEN-CHECK] Tool call detection: testcase_tool_called={testcase_tool_called}, wants_testcase_generation={wants_testcase_generation}, wants_testcase_generation_post={wants_testcase_generation_post}, tool_calls_count={len(tracer.data.get('tool_calls', []))}", "35"))
+            testcase_tool_called = tracer.was_called("start_testcase_generation")
+            logger.info("%s[TESTCASE-GEN-CHECK] Tool call detection: testcase_tool_called=%s, wants_testcase_generation=%s, wants_testcase_generation_post=%s, tool_calls_count=%s%s", _C35, testcase_tool_called, wants_testcase_generation, wants_testcase_generation_post, len(tracer.data.get('tool_calls', [])), _CRESET)
         except Exception as e:
             testcase_tool_called = False
             logger.warning(_color(f"[TESTCASE-GEN-CHECK] Error checking tool calls: {e}", "33"))
@@ -3657,13 +3932,13 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         agent_response_suggests_testcase_gen = "test case generation" in assistant_text.lower() or "confirmation modal" in assistant_text.lower()
         
         if not testcase_tool_called and (final_wants_testcase_generation or agent_response_suggests_testcase_gen):
-            logger.info(_color(f"[TESTCASE-GEN-FALLBACK] Tool was not called but user requested test case generation (user_message='{user_message[:100]}', agent_response_suggests={agent_response_suggests_testcase_gen}) - checking status", "35"))
+            logger.info("%s[TESTCASE-GEN-FALLBACK] Tool was not called but user requested test case generation (user_message='%s', agent_response_suggests=%s) - checking status%s", _C35, user_message[:100], agent_response_suggests_testcase_gen, _CRESET)
             try:
-                status_check = tool_get_usecase_status(usecase_id)
+                status_check = _usecase_status_payload(_post_run_rec())
                 scenario_generation = status_check.get("scenario_generation") or "Not Started"
                 test_case_generation = status_check.get("test_case_generation") or "Not Started"
                 
-                logger.info(_color(f"[TESTCASE-GEN-FALLBACK] Status check: scenario_generation={scenario_generation}, test_case_generation={test_case_generation}", "35"))
+                logger.info("%s[TESTCASE-GEN-FALLBACK] Status check: scenario_generation=%s, test_case_generation=%s%s", _C35, scenario_generation, test_case_generation, _CRESET)
                 
                 if scenario_generation == "Completed" and test_case_generation == "Not Started":
                     logger.info(_color(f"[TESTCASE-GEN-FALLBACK] Conditions met - calling start_testcase_generation tool as fallback", "35"))
@@ -3674,15 +3949,15 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id}", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         # Call the synchronous tool function
                         result = tool_start_testcase_generation(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "confirmation_required":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=confirmation_required usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[TESTCASE-GEN-FALLBACK] Successfully called start_testcase_generation tool", "35"))
                             testcase_tool_called = True  # Now actually called
                         else:
@@ -3696,7 +3971,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                             tracer.finish_tool(tool_entry, False, error=str(e), duration_ms=duration_ms)
                         logger.warning(_color(f"[TESTCASE-GEN-FALLBACK] Error calling start_testcase_generation: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[TESTCASE-GEN-FALLBACK] Conditions not met: scenario_generation={scenario_generation}, test_case_generation={test_case_generation}", "35"))
+                    logger.info("%s[TESTCASE-GEN-FALLBACK] Conditions not met: scenario_generation=%s, test_case_generation=%s%s", _C35, scenario_generation, test_case_generation, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[TESTCASE-GEN-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
@@ -3713,7 +3988,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                             # Check if result_preview contains confirmation_required status
                             if result_preview and "confirmation_required" in result_preview:
                                 tool_result_confirmation = True
-                                logger.info(_color(f"[TESTCASE-GEN-MODAL] Tool result indicates confirmation_required: {result_preview}", "35"))
+                                logger.info("%s[TESTCASE-GEN-MODAL] Tool result indicates confirmation_required: %s%s", _C35, result_preview, _CRESET)
                                 break
                 except Exception as e:
                     logger.warning(_color(f"[TESTCASE-GEN-MODAL] Error checking tool result: {e}", "33"))
@@ -3723,63 +3998,48 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                 # Ensure UsecaseMetadata is imported
                 from models.usecase.usecase import UsecaseMetadata
                 
-                with get_db_context() as db:
-                    rec = db.query(UsecaseMetadata).filter(
-                        UsecaseMetadata.usecase_id == usecase_id,
-                        UsecaseMetadata.is_deleted == False,
-                    ).first()
-                    if rec:
-                        scenario_generation = rec.scenario_generation or "Not Started"
-                        test_case_generation = rec.test_case_generation or "Not Started"
-                        
+                rec = _post_run_rec()
+                if rec:
+                    scenario_generation = rec.scenario_generation or "Not Started"
+                    test_case_generation = rec.test_case_generation or "Not Started"
+                    
+                    logger.info(_color(
+                        f"[TESTCASE-GEN-MODAL] Status check: scenario_generation={scenario_generation}, "
+                        f"test_case_generation={test_case_generation}, tool_result_confirmation={tool_result_confirmation}",
+                        "35"
+                    ))
+                    
+                    # Emit if tool result says confirmation_required (most reliable) OR database status matches
+                    should_emit_confirmation = tool_result_confirmation or (scenario_generation == "Completed" and test_case_generation == "Not Started")
+                    if should_emit_confirmation:
+                        logger.info(_color(f"[TESTCASE-GEN-MODAL] Emitting confirmation_required event", "35"))
+                        assistant_text = orjson.dumps({
+                            "system_event": "testcase_generation_confirmation_required",
+                            "usecase_id": usecase_id_str,
+                        }).decode()
+                    elif test_case_generation == "In Progress":
+                        logger.info(_color(f"[TESTCASE-GEN-MODAL] Generation in progress; emitting in_progress event", "35"))
+                        assistant_text = orjson.dumps({
+                            "system_event": "testcase_generation_in_progress",
+                            "usecase_id": usecase_id_str,
+                        }).decode()
+                    else:
                         logger.info(_color(
-                            f"[TESTCASE-GEN-MODAL] Status check: scenario_generation={scenario_generation}, "
-                            f"test_case_generation={test_case_generation}, tool_result_confirmation={tool_result_confirmation}",
+                            f"[TESTCASE-GEN-MODAL] Conditions not met for event emission; keeping agent response",
                             "35"
                         ))
-                        
-                        # Emit if tool result says confirmation_required (most reliable) OR database status matches
-                        should_emit_confirmation = tool_result_confirmation or (scenario_generation == "Completed" and test_case_generation == "Not Started")
-                        if should_emit_confirmation:
-                            logger.info(_color(f"[TESTCASE-GEN-MODAL] Emitting confirmation_required event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "testcase_generation_confirmation_required",
-                                "usecase_id": str(usecase_id),
-                            })
-                        elif test_case_generation == "In Progress":
-                            logger.info(_color(f"[TESTCASE-GEN-MODAL] Generation in progress; emitting in_progress event", "35"))
-                            assistant_text = json.dumps({
-                                "system_event": "testcase_generation_in_progress",
-                                "usecase_id": str(usecase_id),
-                            })
-                        else:
-                            logger.info(_color(
-                                f"[TESTCASE-GEN-MODAL] Conditions not met for event emission; keeping agent response",
-                                "35"
-                            ))
-                    else:
-                        logger.warning(_color(f"[TESTCASE-GEN-MODAL] Usecase not found: {usecase_id}", "33"))
+                else:
+                    logger.warning(_color(f"[TESTCASE-GEN-MODAL] Usecase not found: {usecase_id}", "33"))
             except Exception as e:
                 logger.warning(_color(f"[TESTCASE-GEN-MODAL] Event emission failed: {e}", "33"), exc_info=True)
         
         # Post-run: Check if user wants to see requirements but tool wasn't called
-        user_text_lower_show_req = user_message.lower()
-        show_requirements_keywords = [
-            "show requirements", "display requirements", "show me the requirements",
-            "view requirements", "show the requirements", "can i see them",
-            "can i see the requirements", "can you show the requirements",
-            "can you show them", "if requirements are done, can i see them",
-            "i want to see the requirements", "i want to see them",
-            "show them", "show it", "let me see the requirements"
-        ]
-        wants_show_requirements = any(kw in user_text_lower_show_req for kw in show_requirements_keywords) or \
-                                   ("requirements" in user_text_lower_show_req and ("show" in user_text_lower_show_req or "see" in user_text_lower_show_req or "view" in user_text_lower_show_req or "display" in user_text_lower_show_req))
+        wants_show_requirements = any(kw in user_text_lower for kw in _SHOW_REQ_KEYWORDS) or \
+                                   ("requirements" in user_text_lower and ("show" in user_text_lower or "see" in user_text_lower or "view" in user_text_lower or "display" in user_text_lower))
         
         try:
-            show_req_tool_called = any(
-                (tc.get("name") == "show_requirements") for tc in tracer.data.get("tool_calls", [])
-            )
-            logger.info(_color(f"[SHOW-REQ-CHECK] Tool call detection: show_req_tool_called={show_req_tool_called}, wants_show_requirements={wants_show_requirements}, tool_calls_count={len(tracer.data.get('tool_calls', []))}", "35"))
+            show_req_tool_called = tracer.was_called("show_requirements")
+            logger.info("%s[SHOW-REQ-CHECK] Tool call detection: show_req_tool_called=%s, wants_show_requirements=%s, tool_calls_count=%s%s", _C35, show_req_tool_called, wants_show_requirements, len(tracer.data.get('tool_calls', [])), _CRESET)
         except Exception as e:
             show_req_tool_called = False
             logger.warning(_color(f"[SHOW-REQ-CHECK] Error checking tool calls: {e}", "33"))
@@ -3789,12 +4049,12 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         agent_response_suggests_show_req = "retrieved the requirements" in assistant_text.lower() or "requirements" in assistant_text.lower() and ("display" in assistant_text.lower() or "shown" in assistant_text.lower() or "above" in assistant_text.lower())
         
         if not show_req_tool_called and (wants_show_requirements or agent_response_suggests_show_req):
-            logger.info(_color(f"[SHOW-REQ-FALLBACK] Tool was not called but user requested to see requirements (user_message='{user_message[:100]}', agent_response_suggests={agent_response_suggests_show_req}) - checking status", "35"))
+            logger.info("%s[SHOW-REQ-FALLBACK] Tool was not called but user requested to see requirements (user_message='%s', agent_response_suggests=%s) - checking status%s", _C35, user_message[:100], agent_response_suggests_show_req, _CRESET)
             try:
-                status = tool_get_usecase_status(usecase_id)
+                status = _usecase_status_payload(_post_run_rec())
                 requirement_generation = status.get("requirement_generation") or "Not Started"
                 
-                logger.info(_color(f"[SHOW-REQ-FALLBACK] Status check: requirement_generation={requirement_generation}", "35"))
+                logger.info("%s[SHOW-REQ-FALLBACK] Status check: requirement_generation=%s%s", _C35, requirement_generation, _CRESET)
                 
                 if requirement_generation in ("In Progress", "Completed"):
                     logger.info(_color(f"[SHOW-REQ-FALLBACK] Conditions met - calling show_requirements tool as fallback", "35"))
@@ -3805,14 +4065,14 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id}", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         result = tool_show_requirements(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "success":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[SHOW-REQ-FALLBACK] Successfully called show_requirements tool", "35"))
                             # Update assistant_text to indicate requirements were retrieved
                             assistant_text = "I've retrieved the requirements. They will be displayed above for you to review."
@@ -3828,28 +4088,17 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         logger.warning(_color(f"[TOOL-ERROR {tool_name}] {e}", "34"))
                         logger.warning(_color(f"[SHOW-REQ-FALLBACK] Error calling show_requirements: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[SHOW-REQ-FALLBACK] Conditions not met: requirement_generation={requirement_generation}", "35"))
+                    logger.info("%s[SHOW-REQ-FALLBACK] Conditions not met: requirement_generation=%s%s", _C35, requirement_generation, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[SHOW-REQ-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
         # Post-run: Check if user wants to see scenarios but tool wasn't called
-        user_text_lower_show_scen = user_message.lower()
-        show_scenarios_keywords = [
-            "show scenarios", "display scenarios", "show me the scenarios",
-            "view scenarios", "show the scenarios", "can i see the scenarios",
-            "can you show the scenarios", "can you show them",
-            "if scenarios are done, can i see them", "if scenarios are done, can you show them",
-            "i want to see the scenarios", "i want to see them",
-            "show them", "show it", "let me see the scenarios"
-        ]
-        wants_show_scenarios = any(kw in user_text_lower_show_scen for kw in show_scenarios_keywords) or \
-                               ("scenarios" in user_text_lower_show_scen and ("show" in user_text_lower_show_scen or "see" in user_text_lower_show_scen or "view" in user_text_lower_show_scen or "display" in user_text_lower_show_scen))
+        wants_show_scenarios = any(kw in user_text_lower for kw in _SHOW_SCEN_KEYWORDS) or \
+                               ("scenarios" in user_text_lower and ("show" in user_text_lower or "see" in user_text_lower or "view" in user_text_lower or "display" in user_text_lower))
         
         try:
-            show_scen_tool_called = any(
-                (tc.get("name") == "show_scenarios") for tc in tracer.data.get("tool_calls", [])
-            )
-            logger.info(_color(f"[SHOW-SCEN-CHECK] Tool call detection: show_scen_tool_called={show_scen_tool_called}, wants_show_scenarios={wants_show_scenarios}, tool_calls_count={len(tracer.data.get('tool_calls', []))}", "35"))
+            show_scen_tool_called = tracer.was_called("show_scenarios")
+            logger.info("%s[SHOW-SCEN-CHECK] Tool call detection: show_scen_tool_called=%s, wants_show_scenarios=%s, tool_calls_count=%s%s", _C35, show_scen_tool_called, wants_show_scenarios, len(tracer.data.get('tool_calls', [])), _CRESET)
         except Exception as e:
             show_scen_tool_called = False
             logger.warning(_color(f"[SHOW-SCEN-CHECK] Error checking tool calls: {e}", "33"))
@@ -3859,12 +4108,12 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         agent_response_suggests_show_scen = "retrieved the scenarios" in assistant_text.lower() or "scenarios" in assistant_text.lower() and ("display" in assistant_text.lower() or "shown" in assistant_text.lower() or "above" in assistant_text.lower())
         
         if not show_scen_tool_called and (wants_show_scenarios or agent_response_suggests_show_scen):
-            logger.info(_color(f"[SHOW-SCEN-FALLBACK] Tool was not called but user requested to see scenarios (user_message='{user_message[:100]}', agent_response_suggests={agent_response_suggests_show_scen}) - checking status", "35"))
+            logger.info("%s[SHOW-SCEN-FALLBACK] Tool was not called but user requested to see scenarios (user_message='%s', agent_response_suggests=%s) - checking status%s", _C35, user_message[:100], agent_response_suggests_show_scen, _CRESET)
             try:
-                status = tool_get_usecase_status(usecase_id)
+                status = _usecase_status_payload(_post_run_rec())
                 scenario_generation = status.get("scenario_generation") or "Not Started"
                 
-                logger.info(_color(f"[SHOW-SCEN-FALLBACK] Status check: scenario_generation={scenario_generation}", "35"))
+                logger.info("%s[SHOW-SCEN-FALLBACK] Status check: scenario_generation=%s%s", _C35, scenario_generation, _CRESET)
                 
                 if scenario_generation in ("In Progress", "Completed"):
                     logger.info(_color(f"[SHOW-SCEN-FALLBACK] Conditions met - calling show_scenarios tool as fallback", "35"))
@@ -3875,14 +4124,14 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id}", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         result = tool_show_scenarios(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "success":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[SHOW-SCEN-FALLBACK] Successfully called show_scenarios tool", "35"))
                             # Update assistant_text to indicate scenarios were retrieved
                             assistant_text = "I've retrieved the scenarios. They will be displayed above for you to review."
@@ -3898,28 +4147,17 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         logger.warning(_color(f"[TOOL-ERROR {tool_name}] {e}", "34"))
                         logger.warning(_color(f"[SHOW-SCEN-FALLBACK] Error calling show_scenarios: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[SHOW-SCEN-FALLBACK] Conditions not met: scenario_generation={scenario_generation}", "35"))
+                    logger.info("%s[SHOW-SCEN-FALLBACK] Conditions not met: scenario_generation=%s%s", _C35, scenario_generation, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[SHOW-SCEN-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
         # Post-run: Check if user wants to see test cases but tool wasn't called
-        user_text_lower_show_tc = user_message.lower()
-        show_testcases_keywords = [
-            "show test cases", "display test cases", "show me the test cases",
-            "view test cases", "show the test cases", "can i see the test cases",
-            "can you show the test cases", "can you show them",
-            "if test cases are done, can i see them", "if test cases are done, can you show them",
-            "i want to see the test cases", "i want to see them",
-            "show them", "show it", "let me see the test cases"
-        ]
-        wants_show_testcases = any(kw in user_text_lower_show_tc for kw in show_testcases_keywords) or \
-                               (("test case" in user_text_lower_show_tc or "testcase" in user_text_lower_show_tc) and ("show" in user_text_lower_show_tc or "see" in user_text_lower_show_tc or "view" in user_text_lower_show_tc or "display" in user_text_lower_show_tc))
+        wants_show_testcases = any(kw in user_text_lower for kw in _SHOW_TC_KEYWORDS) or \
+                               (("test case" in user_text_lower or "testcase" in user_text_lower) and ("show" in user_text_lower or "see" in user_text_lower or "view" in user_text_lower or "display" in user_text_lower))
         
         try:
-            show_tc_tool_called = any(
-                (tc.get("name") == "show_testcases") for tc in tracer.data.get("tool_calls", [])
-            )
-            logger.info(_color(f"[SHOW-TC-CHECK] Tool call detection: show_tc_tool_called={show_tc_tool_called}, wants_show_testcases={wants_show_testcases}, tool_calls_count={len(tracer.data.get('tool_calls', []))}", "35"))
+            show_tc_tool_called = tracer.was_called("show_testcases")
+            logger.info("%s[SHOW-TC-CHECK] Tool call detection: show_tc_tool_called=%s, wants_show_testcases=%s, tool_calls_count=%s%s", _C35, show_tc_tool_called, wants_show_testcases, len(tracer.data.get('tool_calls', [])), _CRESET)
         except Exception as e:
             show_tc_tool_called = False
             logger.warning(_color(f"[SHOW-TC-CHECK] Error checking tool calls: {e}", "33"))
@@ -3933,12 +4171,12 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         has_markdown_table = ("|-" in assistant_text or "| :" in assistant_text or "|:" in assistant_text) and ("test case" in assistant_text.lower() or "tc-" in assistant_text.lower())
 
         if not show_tc_tool_called and (wants_show_testcases or agent_response_suggests_show_tc) and not has_markdown_table:
-            logger.info(_color(f"[SHOW-TC-FALLBACK] Tool was not called but user requested to see test cases (user_message='{user_message[:100]}', agent_response_suggests={agent_response_suggests_show_tc}) - checking status", "35"))
+            logger.info("%s[SHOW-TC-FALLBACK] Tool was not called but user requested to see test cases (user_message='%s', agent_response_suggests=%s) - checking status%s", _C35, user_message[:100], agent_response_suggests_show_tc, _CRESET)
             try:
-                status = tool_get_usecase_status(usecase_id)
+                status = _usecase_status_payload(_post_run_rec())
                 test_case_generation = status.get("test_case_generation") or "Not Started"
                 
-                logger.info(_color(f"[SHOW-TC-FALLBACK] Status check: test_case_generation={test_case_generation}", "35"))
+                logger.info("%s[SHOW-TC-FALLBACK] Status check: test_case_generation=%s%s", _C35, test_case_generation, _CRESET)
                 
                 if test_case_generation in ("In Progress", "Completed"):
                     logger.info(_color(f"[SHOW-TC-FALLBACK] Conditions met - calling show_testcases tool as fallback", "35"))
@@ -3949,14 +4187,14 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         # Track tool call in tracer
                         tool_entry = tracer.start_tool(tool_name, args_preview=f'{{"usecase_id": "{usecase_id}"}}')
                         tool_start_time = time.time()
-                        logger.info(_color(f"[TOOL-START {tool_name}] usecase_id={usecase_id}", "34"))
+                        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, tool_name, usecase_id_str, _CRESET)
                         
                         result = tool_show_testcases(usecase_id)
                         duration_ms = int((time.time() - tool_start_time) * 1000)
                         
                         if result.get("status") == "success":
-                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id}", duration_ms=duration_ms)
-                            logger.info(_color(f"[TOOL-END {tool_name}] duration={duration_ms}ms", "34"))
+                            tracer.finish_tool(tool_entry, True, result_preview=f"status=success usecase_id={usecase_id_str}", duration_ms=duration_ms)
+                            logger.info("%s[TOOL-END %s] duration=%sms%s", _C34, tool_name, duration_ms, _CRESET)
                             logger.info(_color(f"[SHOW-TC-FALLBACK] Successfully called show_testcases tool", "35"))
                             # Update assistant_text to indicate test cases were retrieved
                             assistant_text = "I've retrieved the test cases. They will be displayed above for you to review."
@@ -3972,7 +4210,7 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                         logger.warning(_color(f"[TOOL-ERROR {tool_name}] {e}", "34"))
                         logger.warning(_color(f"[SHOW-TC-FALLBACK] Error calling show_testcases: {e}", "33"), exc_info=True)
                 else:
-                    logger.info(_color(f"[SHOW-TC-FALLBACK] Conditions not met: test_case_generation={test_case_generation}", "35"))
+                    logger.info("%s[SHOW-TC-FALLBACK] Conditions not met: test_case_generation=%s%s", _C35, test_case_generation, _CRESET)
             except Exception as e:
                 logger.warning(_color(f"[SHOW-TC-FALLBACK] Fallback check failed: {e}", "33"), exc_info=True)
         
@@ -3980,36 +4218,36 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
         try:
             final_tool_calls = tracer.data.get("tool_calls", [])
             final_tool_names = [tc.get("name") for tc in final_tool_calls]
-            logger.info(_color(f"[DEBUG-FINAL] All tool calls before return: {final_tool_names} (count={len(final_tool_calls)})", "36"))
+            logger.info("%s[DEBUG-FINAL] All tool calls before return: %s (count=%s)%s", _C36, final_tool_names, len(final_tool_calls), _CRESET)
         except Exception:
             pass
         
+        # Record the final text after post-run overrides (system_event JSON is passed through as-is)
+        tracer.set_assistant_final(assistant_text)
         return assistant_text, tracer.dump()
     except Exception as e:
-        logger.warning(_color(f"[AGENT-FALLBACK] deepagents unavailable or failed: {e}", "34"))
-        tracer.set_engine("fallback")
+        logger.warning(f"{_C34}[AGENT-FALLBACK] deepagents unavailable or failed: {e}{_CRESET}")
+        # A turn that did not unwind in time still writes to tracer, so the fallback gets its own
+        fallback_tracer = TraceCollector() if turn_abandoned else tracer
+        fallback_tracer.set_engine("fallback")
         # Fallback: minimal rule-based (ReAct-like) selection with traced tool calls
         # 1) Check status (traced)
         name = "get_usecase_status"
-        entry = tracer.start_tool(name, args_preview="{}")
-        t0 = time.time()
-        logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+        entry = fallback_tracer.start_tool(name, args_preview="{}")
+        t0 = time.monotonic_ns()
+        logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id_str, _CRESET)
         try:
-            status = tool_get_usecase_status(usecase_id)
-            tracer.finish_tool(entry, True, result_preview=str({k: status.get(k) for k in ["text_extraction", "requirement_generation", "scenario_generation", "test_case_generation"]}), duration_ms=int((time.time()-t0)*1000))
-            try:
-                import json as _json
-                out = _json.dumps(status, ensure_ascii=False)[:5000]
-                if len(_json.dumps(status, ensure_ascii=False)) > 5000:
-                    out += "... [TRUNCATED]"
-                logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-            except Exception:
-                pass
-            logger.info(_color(f"[TOOL-END {name}]", "34"))
+            # Reuse the primary path's result from this turn if it already fetched it
+            status = fallback_tracer.cached_result((name,))
+            if status is None:
+                status = tool_get_usecase_status(usecase_id)
+                fallback_tracer.cache_result((name,), status)
+            fallback_tracer.finish_tool(entry, True, result_preview=str({k: status.get(k) for k in ["text_extraction", "requirement_generation", "scenario_generation", "test_case_generation"]}), duration_ms=(time.monotonic_ns()-t0)//1_000_000)
+            _log_tool_output(name, status)
+            logger.info("%s[TOOL-END %s]%s", _C34, name, _CRESET)
         except Exception as ex:
-            tracer.finish_tool(entry, False, error=str(ex), duration_ms=int((time.time()-t0)*1000))
-            logger.exception(_color(f"[TOOL-ERROR {name}] {ex}", "34"))
-        text = user_message.lower()
+            fallback_tracer.finish_tool(entry, False, error=str(ex), duration_ms=(time.monotonic_ns()-t0)//1_000_000)
+            logger.exception(f"{_C34}[TOOL-ERROR {name}] {ex}{_CRESET}")
         # Log what the fallback will consider as input (no history in fallback)
         try:
             _log_agent_input([{ "role": "user", "content": user_message }], label="fallback", usecase_id=usecase_id)
@@ -4017,55 +4255,37 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
             pass
         assistant_text = ""
         # Determine intent
-        wants_reqs = any(k in text for k in ["generate requirements", "extract requirements", "create requirements", "requirements list", "preconditions of requirements", "read requirements"])
-        wants_doc_read = any(
-            k in text for k in [
-                "read the pdf",
-                "read the document",
-                "read the documents",
-                "look into this document",
-                "summarize",
-                "summarise",
-                "summarize the file",
-                "summarize the pdf",
-                "extract key points",
-                "what does this attachment",
-                "get details from the uploaded",
-                "analyze the document",
-                "analyze documents",
-            ]
-        )
+        wants_reqs = _FALLBACK_REQ_RE.search(user_message) is not None
+        wants_doc_read = _FALLBACK_DOC_RE.search(user_message) is not None
         if wants_reqs:
             # Gate by consent and current status
             req_status = status.get("requirement_generation") if isinstance(status, dict) else None
             consent = status.get("requirement_generation_confirmed") if isinstance(status, dict) else False
             if req_status == "In Progress":
-                assistant_text = json.dumps({"system_event": "requirement_generation_in_progress", "usecase_id": str(usecase_id)})
+                assistant_text = orjson.dumps({"system_event": "requirement_generation_in_progress", "usecase_id": usecase_id_str}).decode()
             elif not consent and req_status in (None, "Not Started", "Failed"):
-                assistant_text = json.dumps({"system_event": "requirement_generation_confirmation_required", "usecase_id": str(usecase_id)})
+                assistant_text = orjson.dumps({"system_event": "requirement_generation_confirmation_required", "usecase_id": usecase_id_str}).decode()
             else:
                 assistant_text = "Requirements request acknowledged."
         elif wants_doc_read:
             name = "get_documents_markdown"
-            entry = tracer.start_tool(name, args_preview="{}")
-            t0 = time.time()
-            logger.info(_color(f"[TOOL-START {name}] usecase_id={usecase_id}", "34"))
+            entry = fallback_tracer.start_tool(name, args_preview="{}")
+            t0 = time.monotonic_ns()
+            logger.info("%s[TOOL-START %s] usecase_id=%s%s", _C34, name, usecase_id_str, _CRESET)
             try:
-                docs = tool_get_documents_markdown(usecase_id)
+                docs = fallback_tracer.cached_result((name,))
+                if docs is None:
+                    docs = tool_get_documents_markdown(usecase_id)
+                    fallback_tracer.cache_result((name,), docs)
                 combined = docs.get("combined_markdown", "")
-                tracer.finish_tool(entry, True, result_preview=f"files={len(docs.get('files', []))}", duration_ms=int((time.time()-t0)*1000), chars_read=len(combined))
-                try:
-                    import json as _json
-                    out = _json.dumps(docs, ensure_ascii=False)[:5000]
-                    if len(_json.dumps(docs, ensure_ascii=False)) > 5000:
-                        out += "... [TRUNCATED]"
-                    logger.info(_color(f"[TOOL-OUTPUT {name}] {out}", "34"))
-                except Exception:
-                    pass
-                logger.info(_color(f"[TOOL-END {name}] chars_read={len(combined)}", "34"))
+                fallback_tracer.finish_tool(entry, True, result_preview=f"files={len(docs.get('files', []))}", duration_ms=(time.monotonic_ns()-t0)//1_000_000, chars_read=len(combined))
+                # Combined markdown can be megabytes; only serialize when raw output logging is on
+                if _LOG_RAW and logger.isEnabledFor(logging.INFO):
+                    _log_tool_output(name, _documents_log_view(docs))
+                logger.info("%s[TOOL-END %s] chars_read=%s%s", _C34, name, len(combined), _CRESET)
             except Exception as ex:
-                tracer.finish_tool(entry, False, error=str(ex), duration_ms=int((time.time()-t0)*1000))
-                logger.exception(_color(f"[TOOL-ERROR {name}] {ex}", "34"))
+                fallback_tracer.finish_tool(entry, False, error=str(ex), duration_ms=(time.monotonic_ns()-t0)//1_000_000)
+                logger.exception(f"{_C34}[TOOL-ERROR {name}] {ex}{_CRESET}")
             assistant_text = "Documents read. Ask a related query."
         else:
             assistant_text = (
@@ -4079,8 +4299,8 @@ def run_agent_turn(usecase_id, user_message: str, model: str | None = None, turn
                 "Cortexa uses your own API keys (BYOK model) to ensure security and give you full control.\n\n"
                 "Once you've added your key, upload your requirements documents and I'll help you create test cases!"
             )
-        tracer.set_assistant_final(assistant_text)
-        logger.info(_color(f"[AGENT] {assistant_text}", "32"))
-        return assistant_text, tracer.dump()
+        fallback_tracer.set_assistant_final(assistant_text)
+        logger.info("%s[AGENT] %s%s", _C32, assistant_text, _CRESET)
+        return assistant_text, fallback_tracer.dump()
 
 
@@ -1,6 +1,8 @@
 import logging
+import queue
+import threading
+import time
 import uuid
-import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from uuid import UUID
@@ -9,11 +11,90 @@ from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.outputs import LLMResult
 from langchain_core.messages import BaseMessage, AIMessage
 
+from sqlalchemy import insert
+
 from db.session import get_db_context
 from models.agent.trace import AgentTrace
 
 logger = logging.getLogger(__name__)
 
+# Traces are written by a background thread in batches so the callback hot path never
+# waits on a DB round-trip; one commit covers up to _TRACE_BATCH_MAX rows or _TRACE_BATCH_WINDOW_S.
+_TRACE_BATCH_MAX = 64
+_TRACE_BATCH_WINDOW_S = 0.05
+
+_trace_queue: "queue.Queue[Any]" = queue.Queue()
+_writer_lock = threading.Lock()
+_writer_thread: Optional[threading.Thread] = None
+
+
+def _write_batch(batch: List[Dict[str, Any]]) -> None:
+    try:
+        with get_db_context() as db:
+            # ORM bulk INSERT: one multi-row statement, no per-object unit-of-work tracking
+            db.execute(insert(AgentTrace), batch)
+            db.commit()
+        return
+    except Exception as e:
+        if len(batch) == 1:
+            logger.warning(f"[DB-TRACE] Failed to write trace: {e}")
+            return
+    # One bad row (e.g. unserializable metadata) should not drop the rest of the batch
+    for row in batch:
+        _write_batch([row])
+
+
+def _drain_loop() -> None:
+    while True:
+        item = _trace_queue.get()
+        batch: List[Dict[str, Any]] = []
+        waiters: List[threading.Event] = []
+        deadline = time.monotonic() + _TRACE_BATCH_WINDOW_S
+        while True:
+            if isinstance(item, threading.Event):
+                # Flush sentinel: write what we have now, then release the waiter
+                waiters.append(item)
+                break
+            batch.append(item)
+            if len(batch) >= _TRACE_BATCH_MAX:
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _trace_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _write_batch(batch)
+        for w in waiters:
+            w.set()
+
+
+def _ensure_writer() -> None:
+    global _writer_thread
+    if _writer_thread is not None and _writer_thread.is_alive():
+        return
+    with _writer_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_drain_loop, name="agent-trace-writer", daemon=True)
+            _writer_thread.start()
+
+
+def enqueue_trace(row: Dict[str, Any]) -> None:
+    """Queue one AgentTrace row (attribute name -> value) for the background batch writer."""
+    _ensure_writer()
+    _trace_queue.put_nowait(row)
+
+
+def flush_traces(timeout: float = 5.0) -> bool:
+    """Block until every trace queued so far has been written (or timeout elapses)."""
+    _ensure_writer()
+    done = threading.Event()
+    _trace_queue.put_nowait(done)
+    return done.wait(timeout)
+
+
 class DatabaseTraceCallback(BaseCallbackHandler):
     """
     Callback handler that logs agent steps (thoughts, tool calls) to the database.
@@ -42,24 +123,22 @@ class DatabaseTraceCallback(BaseCallbackHandler):
                 if not text and isinstance(gen.message, BaseMessage):
                     text = gen.message.content
 
-            if not text:
+            # Whitespace-only thoughts (common around tool calls) are noise; skip before numbering a step
+            if not text or (isinstance(text, str) and not text.strip()):
                 return
 
             self.step_counter += 1
             run_id = kwargs.get("run_id") or uuid.uuid4()
             
-            with get_db_context() as db:
-                trace = AgentTrace(
-                    usecase_id=self.usecase_id,
-                    turn_id=self.turn_id,
-                    run_id=run_id,
-                    step_number=self.step_counter,
-                    step_type="thought",
-                    content={"text": text},
-                    metadata_={"response_metadata": response.llm_output},
-                )
-                db.add(trace)
-                db.commit()
+            enqueue_trace({
+                "usecase_id": self.usecase_id,
+                "turn_id": self.turn_id,
+                "run_id": run_id,
+                "step_number": self.step_counter,
+                "step_type": "thought",
+                "content": {"text": text},
+                "metadata_": {"response_metadata": response.llm_output},
+            })
                 
         except Exception as e:
             logger.warning(f"[DB-TRACE] Failed to log LLM end: {e}")
@@ -73,40 +152,37 @@ class DatabaseTraceCallback(BaseCallbackHandler):
             run_id = kwargs.get("run_id") or uuid.uuid4()
             tool_name = serialized.get("name") if serialized else "unknown"
             
-            with get_db_context() as db:
-                trace = AgentTrace(
-                    usecase_id=self.usecase_id,
-                    turn_id=self.turn_id,
-                    run_id=run_id,
-                    step_number=self.step_counter,
-                    step_type="tool_start",
-                    content={"input": input_str, "tool": tool_name},
-                    metadata_={"tool_name": tool_name},
-                )
-                db.add(trace)
-                db.commit()
+            enqueue_trace({
+                "usecase_id": self.usecase_id,
+                "turn_id": self.turn_id,
+                "run_id": run_id,
+                "step_number": self.step_counter,
+                "step_type": "tool_start",
+                "content": {"input": input_str, "tool": tool_name},
+                "metadata_": {"tool_name": tool_name},
+            })
         except Exception as e:
             logger.warning(f"[DB-TRACE] Failed to log tool start: {e}")
 
     def on_tool_end(self, output: str, **kwargs: Any) -> Any:
         """Run when tool ends running."""
         try:
+            tool_name = kwargs.get("name", "unknown")
+            if tool_name == "unknown" and (output is None or output == ""):
+                return
+
             self.step_counter += 1
             run_id = kwargs.get("run_id") or uuid.uuid4()
-            tool_name = kwargs.get("name", "unknown")
 
-            with get_db_context() as db:
-                trace = AgentTrace(
-                    usecase_id=self.usecase_id,
-                    turn_id=self.turn_id,
-                    run_id=run_id,
-                    step_number=self.step_counter,
-                    step_type="tool_end",
-                    content={"output": str(output) if not isinstance(output, (dict, list, str, int, float, bool, type(None))) else output},
-                    metadata_={"tool_name": tool_name},
-                )
-                db.add(trace)
-                db.commit()
+            enqueue_trace({
+                "usecase_id": self.usecase_id,
+                "turn_id": self.turn_id,
+                "run_id": run_id,
+                "step_number": self.step_counter,
+                "step_type": "tool_end",
+                "content": {"output": str(output) if not isinstance(output, (dict, list, str, int, float, bool, type(None))) else output},
+                "metadata_": {"tool_name": tool_name},
+            })
         except Exception as e:
             logger.warning(f"[DB-TRACE] Failed to log tool end: {e}")
 
@@ -116,17 +192,14 @@ class DatabaseTraceCallback(BaseCallbackHandler):
             self.step_counter += 1
             run_id = kwargs.get("run_id") or uuid.uuid4()
             
-            with get_db_context() as db:
-                trace = AgentTrace(
-                    usecase_id=self.usecase_id,
-                    turn_id=self.turn_id,
-                    run_id=run_id,
-                    step_number=self.step_counter,
-                    step_type="error",
-                    content={"error": str(error)},
-                    metadata_={},
-                )
-                db.add(trace)
-                db.commit()
+            enqueue_trace({
+                "usecase_id": self.usecase_id,
+                "turn_id": self.turn_id,
+                "run_id": run_id,
+                "step_number": self.step_counter,
+                "step_type": "error",
+                "content": {"error": str(error)},
+                "metadata_": {},
+            })
         except Exception as e:
             logger.warning(f"[DB-TRACE] Failed to log tool error: {e}")
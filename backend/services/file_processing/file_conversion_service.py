@@ -1,12 +1,60 @@
+import atexit
 import os
+import shutil
 import subprocess
+import tempfile
+import threading
 from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+
+# LibreOffice profiles live under one private directory per process, removed at exit.
+# Each running soffice needs its own profile, so concurrent conversions (threadpool
+# callers) take a slot; released slots are reused so a profile is initialised only once.
+_profile_root: Optional[str] = None
+_free_profile_slots: List[int] = []
+_profile_slot_count = 0
+_profile_lock = threading.Lock()
+
+
+def _remove_profiles() -> None:
+    if _profile_root is not None:
+        shutil.rmtree(_profile_root, ignore_errors=True)
+
+
+def _acquire_profile_slot() -> int:
+    global _profile_root, _profile_slot_count
+    with _profile_lock:
+        if _profile_root is None:
+            _profile_root = tempfile.mkdtemp(prefix="lo_profiles_")
+            atexit.register(_remove_profiles)
+        if _free_profile_slots:
+            return _free_profile_slots.pop()
+        _profile_slot_count += 1
+        return _profile_slot_count - 1
+
+
+def _release_profile_slot(slot: int) -> None:
+    with _profile_lock:
+        _free_profile_slots.append(slot)
+
+
+def _lo_profile_url(slot: int) -> str:
+    return Path(_profile_root, f"slot_{slot}").as_uri()
+
+
+# Resolved once so each conversion skips the PATH search
+_SOFFICE = shutil.which("soffice") or "/usr/bin/soffice"
+_CONVERT_TIMEOUT_S = 120
 
 
 def docx_to_pdf(docx_file_path):
     """
     Convert a DOCX file to PDF using LibreOffice.
     
+    Safe to call from several threads: each call runs soffice under its own profile slot.
+    
     Args:
         docx_file_path (str): Path to the DOCX file
         
@@ -16,6 +64,7 @@ def docx_to_pdf(docx_file_path):
     Raises:
         FileNotFoundError: If the DOCX file or generated PDF is not found
         subprocess.CalledProcessError: If LibreOffice conversion fails
+        subprocess.TimeoutExpired: If LibreOffice does not finish within the timeout
     """
     if not os.path.isfile(docx_file_path):
         raise FileNotFoundError(f"File not found: {docx_file_path}")
@@ -23,26 +72,46 @@ def docx_to_pdf(docx_file_path):
     directory, filename = os.path.split(docx_file_path)
     base_name, _ = os.path.splitext(filename)
     
-    # Use LibreOffice to convert DOCX to PDF
-    convert_command = [
-        "soffice",
-        "--headless",
-        "--convert-to", "pdf",
-        docx_file_path,
-        "--outdir", directory
-    ]
-    
-    subprocess.run(convert_command, check=True)
-    
-    # Check if the PDF was generated
-    generated_pdf_path = os.path.join(directory, f"{base_name}.pdf")
-    if not os.path.exists(generated_pdf_path):
-        raise FileNotFoundError(f"Converted PDF not found: {generated_pdf_path}")
-    
-    # Add timestamp to the filename to avoid conflicts
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    new_pdf_filename = f"{base_name}_{timestamp}.pdf"
-    new_pdf_path = os.path.join(directory, new_pdf_filename)
-    os.rename(generated_pdf_path, new_pdf_path)
+    # Convert into a private directory so concurrent conversions of the same base name
+    # cannot overwrite each other's output
+    out_dir = tempfile.mkdtemp(prefix="conv_", dir=directory)
+    slot = _acquire_profile_slot()
+    try:
+        # Use LibreOffice to convert DOCX to PDF
+        convert_command = [
+            _SOFFICE,
+            f"-env:UserInstallation={_lo_profile_url(slot)}",
+            "--headless",
+            "--norestore",
+            "--nologo",
+            "--nodefault",
+            "--convert-to", "pdf",
+            docx_file_path,
+            "--outdir", out_dir
+        ]
+        
+        subprocess.run(
+            convert_command,
+            check=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            close_fds=True,
+            timeout=_CONVERT_TIMEOUT_S,
+        )
+        
+        # Check if the PDF was generated
+        generated_pdf_path = os.path.join(out_dir, f"{base_name}.pdf")
+        if not os.path.exists(generated_pdf_path):
+            raise FileNotFoundError(f"Converted PDF not found: {generated_pdf_path}")
+        
+        # Add timestamp to the filename to avoid conflicts
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        new_pdf_filename = f"{base_name}_{timestamp}.pdf"
+        new_pdf_path = os.path.join(directory, new_pdf_filename)
+        os.replace(generated_pdf_path, new_pdf_path)
+    finally:
+        _release_profile_slot(slot)
+        shutil.rmtree(out_dir, ignore_errors=True)
     
     return new_pdf_path
@@ -1,8 +1,11 @@
 import os
 import re
+import shutil
+from functools import lru_cache
 from typing import Tuple
-from core.config import FileStorageConfigs, HostingConfigs
+from core.config import FileStorageConfigs, FirebaseConfigs, HostingConfigs
 
+_UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^a-zA-Z0-9.\-_]')
 
 
 def sanitize_filename(filename: str) -> str:
@@ -11,8 +14,10 @@ def sanitize_filename(filename: str) -> str:
     """
     # Get only the base name
     filename = os.path.basename(filename)
-    # Remove any characters that aren't alphanumeric, dots, hyphens, or underscores
-    filename = re.sub(r'[^a-zA-Z0-9.\-_]', '', filename)
+    # Remove any characters that aren't alphanumeric, dots, hyphens, or underscores;
+    # already-clean names (the common case) skip the substitution
+    if _UNSAFE_FILENAME_CHARS_RE.search(filename):
+        filename = _UNSAFE_FILENAME_CHARS_RE.sub('', filename)
     # Ensure it's not empty and doesn't start with a dot
     if not filename or filename.startswith('.'):
         filename = f"uploaded_file_{os.urandom(4).hex()}"
@@ -33,38 +38,44 @@ def _save_to_local(file) -> Tuple[bool, str, str | None]:
         filename = sanitize_filename(file.filename)
         destination_path = os.path.join(uploads_dir, filename)
         
+        # Stream in 1 MB chunks so large uploads are never held in memory whole
+        file.file.seek(0)
         with open(destination_path, "wb") as out_f:
-            out_f.write(file.file.read())
+            shutil.copyfileobj(file.file, out_f, length=1024 * 1024)
         url = f"{HostingConfigs.URL}/uploads/{filename}"
         return True, f"File '{filename}' saved locally.", url
     except Exception as e:
         return False, f"Error saving file locally: {e}", None
 
 
+@lru_cache(maxsize=1)
+def _firebase_bucket():
+    """Initialize the Firebase app once and reuse its bucket handle (and HTTP session) across uploads."""
+    import firebase_admin
+    from firebase_admin import credentials, storage
+
+    # Initialize Firebase app if not already initialized
+    if not firebase_admin._apps:
+        # Check if service account file exists
+        if not os.path.exists(FirebaseConfigs.SERVICE_ACCOUNT_PATH):
+            raise FileNotFoundError(f"Service account file not found at {FirebaseConfigs.SERVICE_ACCOUNT_PATH}")
+
+        # Strip gs:// if present in bucket name
+        bucket_name = FirebaseConfigs.STORAGE_BUCKET
+        if bucket_name.startswith("gs://"):
+            bucket_name = bucket_name[5:]
+
+        cred = credentials.Certificate(FirebaseConfigs.SERVICE_ACCOUNT_PATH)
+        firebase_admin.initialize_app(cred, {
+            'storageBucket': bucket_name
+        })
+
+    return storage.bucket()
+
+
 def _upload_to_firebase(file) -> Tuple[bool, str, str | None]:
     try:
-        import firebase_admin
-        from firebase_admin import credentials, storage
-        from core.config import FirebaseConfigs
-        
-        # Initialize Firebase app if not already initialized
-        if not firebase_admin._apps:
-            # Check if service account file exists
-            if not os.path.exists(FirebaseConfigs.SERVICE_ACCOUNT_PATH):
-                return False, f"Service account file not found at {FirebaseConfigs.SERVICE_ACCOUNT_PATH}", None
-            
-            # Strip gs:// if present in bucket name
-            bucket_name = FirebaseConfigs.STORAGE_BUCKET
-            if bucket_name.startswith("gs://"):
-                bucket_name = bucket_name[5:]
-                
-            cred = credentials.Certificate(FirebaseConfigs.SERVICE_ACCOUNT_PATH)
-            firebase_admin.initialize_app(cred, {
-                'storageBucket': bucket_name
-            })
-
-            
-        bucket = storage.bucket()
+        bucket = _firebase_bucket()
         filename = sanitize_filename(file.filename)
         blob = bucket.blob(f"uploads/{filename}")
         
@@ -72,6 +83,10 @@ def _upload_to_firebase(file) -> Tuple[bool, str, str | None]:
         file.file.seek(0)
         blob.upload_from_file(file.file, content_type=file.content_type)
         
+        if FirebaseConfigs.UNIFORM_PUBLIC_READ:
+            # Bucket-level IAM already makes objects readable; public_url is built locally
+            return True, f"File '{filename}' uploaded successfully to Firebase Storage.", blob.public_url
+
         # Make public key
         blob.make_public()
         
@@ -79,6 +94,8 @@ def _upload_to_firebase(file) -> Tuple[bool, str, str | None]:
 
     except ImportError:
         return False, "firebase-admin package not installed. Run 'pip install firebase-admin'", None
+    except FileNotFoundError as e:
+        return False, str(e), None
     except Exception as e:
         return False, f"Error uploading file to Firebase: {e}", None
 
@@ -1,15 +1,24 @@
 import os
 import io
+import asyncio
+import hashlib
 import logging
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from urllib.parse import urlparse
 import re
+import tempfile
 
+import aiohttp
 import requests
 from pypdf import PdfReader
 import pdfplumber
 
+from core.config import FileProcessingConfigs, OCRServiceConfigs
 from core.security import validate_url_for_ssrf, SecurityException
 
 
@@ -24,7 +33,8 @@ def download_file_to_bytes(url: str) -> bytes:
     Returns empty bytes on failure.
     """
     try:
-        logger.info("download_file_to_bytes: start url=%s", url)
+        if OCRServiceConfigs.VERBOSE_FILE_LOGS:
+            logger.info("download_file_to_bytes: start url=%s", url)
         # Prefer local mapping for anything under /uploads/, even if the URL is http(s)
         if "/uploads/" in url:
             filename = url.split("/uploads/")[-1]
@@ -35,12 +45,14 @@ def download_file_to_bytes(url: str) -> bytes:
                 backend_dir / "uploads" / filename,
                 Path("uploads") / filename,
             ]
+            # Open each candidate directly rather than stat-probing it first
             for p in candidates:
-                if p.exists():
-                    logger.info("download_file_to_bytes: reading local path=%s", str(p))
+                try:
                     data = p.read_bytes()
-                    logger.info("download_file_to_bytes: local bytes=%d", len(data))
-                    return data
+                except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+                    continue
+                logger.info("download_file_to_bytes: local path=%s bytes=%d", str(p), len(data))
+                return data
             logger.warning("download_file_to_bytes: no local file found for %s (checked %s)", filename, ", ".join(str(c) for c in candidates))
             # Validate URL for SSRF before any HTTP fetch or host-based logic
             try:
@@ -73,16 +85,59 @@ def download_file_to_bytes(url: str) -> bytes:
                 return b""
         # Fallback: if path exists directly
         path = Path(url)
-        if path.exists():
-            logger.info("download_file_to_bytes: reading direct path=%s", str(path))
+        try:
             data = path.read_bytes()
-            logger.info("download_file_to_bytes: direct bytes=%d", len(data))
+        except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
+            pass
+        else:
+            logger.info("download_file_to_bytes: direct path=%s bytes=%d", str(path), len(data))
             return data
     except Exception as e:
         logger.exception("download_file_to_bytes: error for url=%s: %s", url, e)
     return b""
 
 
+# Network reads are streamed in 1 MiB chunks rather than buffered by the client library
+_DOWNLOAD_CHUNK_SIZE = 1 << 20
+_DOWNLOAD_TIMEOUT_S = 15
+
+
+async def download_file_to_bytes_async(url: str, session: Optional[aiohttp.ClientSession] = None) -> bytes:
+    """Async variant of download_file_to_bytes for use inside request handlers.
+
+    Remote http(s) files are streamed with aiohttp so the event loop is never blocked;
+    pass a shared session to reuse keep-alive connections across files. Local /uploads/
+    and direct paths are read by download_file_to_bytes on a worker thread.
+    Returns empty bytes on failure.
+    """
+    if "/uploads/" in url or not (url.startswith("http://") or url.startswith("https://")):
+        return await asyncio.to_thread(download_file_to_bytes, url)
+
+    try:
+        validate_url_for_ssrf(url)
+    except SecurityException as se:
+        logger.warning(f"download_file_to_bytes_async: blocking SSRF attempt: {se}")
+        return b""
+
+    own_session = session is None
+    if own_session:
+        session = aiohttp.ClientSession()
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=_DOWNLOAD_TIMEOUT_S)) as resp:
+            resp.raise_for_status()
+            buf = bytearray()
+            async for chunk in resp.content.iter_chunked(_DOWNLOAD_CHUNK_SIZE):
+                buf.extend(chunk)
+        logger.info("download_file_to_bytes_async: http fetched bytes=%d from %s", len(buf), url)
+        return bytes(buf)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.exception("download_file_to_bytes_async: http fetch failed for %s: %s", url, e)
+        return b""
+    finally:
+        if own_session:
+            await session.close()
+
+
 def extract_pdf_text(file_bytes: bytes) -> str:
     """Extract full text from a PDF given as bytes. Returns empty string on failure.
 
@@ -220,11 +275,14 @@ def _extract_single_page_markdown(page) -> str:
         lines_map.setdefault(key, []).append(ch)
     line_keys = sorted(lines_map.keys())
 
-    # Detect tables
-    try:
-        tables = page.extract_tables() or []
-    except Exception:
-        tables = []
+    # Detect tables. The default "lines" strategy builds tables only from ruling
+    # edges, so pages without lines, rects or curves skip the detector entirely
+    tables = []
+    if page.lines or page.rects or page.curves:
+        try:
+            tables = page.extract_tables() or []
+        except Exception:
+            tables = []
 
     # Render text lines first
     code_block_open = False
@@ -352,6 +410,10 @@ def extract_pdf_markdown_pagewise(file_bytes: bytes) -> List[Dict[str, Any]]:
                         "page_number": page_num,
                         "markdown": ""
                     })
+                finally:
+                    # Drop the page's parsed layout objects before moving on so peak
+                    # memory tracks one page rather than the whole document
+                    page.close()
         
         total_chars = sum(len(p["markdown"]) for p in pages_data)
         logger.info(f"extract_pdf_markdown_pagewise: extracted {len(pages_data)} pages, total chars={total_chars}")
@@ -361,6 +423,147 @@ def extract_pdf_markdown_pagewise(file_bytes: bytes) -> List[Dict[str, Any]]:
         return []
 
 
+def _extract_page_range_markdown(pdf_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """Extract pages [start, end) in a worker process; each worker opens its own document.
+
+    Workers get a file path rather than the bytes so the document is not pickled once per shard.
+    """
+    pages_data: List[Dict[str, Any]] = []
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, end + 1))) as pdf:
+        for page_num, page in enumerate(pdf.pages, start=start + 1):
+            try:
+                page_md = _extract_single_page_markdown(page)
+            except Exception as e:
+                logger.warning(f"extract_pdf_markdown_pagewise: failed to extract page {page_num}: {e}")
+                page_md = ""
+            finally:
+                page.close()
+            pages_data.append({
+                "page_number": page_num,
+                "markdown": page_md
+            })
+    return pages_data
+
+
+_EXTRACT_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _get_extract_pool() -> ProcessPoolExecutor:
+    # One pool per process, shared by every upload, so concurrent files queue their
+    # page shards on the same workers instead of each spawning its own processes.
+    # Workers are spawned, not forked: the server process holds threads, DB pools and
+    # sockets that must not be copied into a child.
+    global _EXTRACT_POOL
+    if _EXTRACT_POOL is None:
+        _EXTRACT_POOL = ProcessPoolExecutor(
+            max_workers=FileProcessingConfigs.EXTRACT_WORKERS,
+            mp_context=get_context("spawn"),
+        )
+    return _EXTRACT_POOL
+
+
+# Page-wise results keyed by the PDF's sha256, so the same document uploaded again
+# (another usecase, a re-upload) skips extraction entirely. LRU bounded by the total
+# markdown size it holds, in-process only.
+_PAGEWISE_CACHE: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+_PAGEWISE_CACHE_SIZES: Dict[str, int] = {}
+_PAGEWISE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+_pagewise_cache_bytes = 0
+
+
+def _pagewise_cache_put(digest: str, pages_data: List[Dict[str, Any]]) -> None:
+    global _pagewise_cache_bytes
+    size = sum(len(p["markdown"]) for p in pages_data)
+    if size > _PAGEWISE_CACHE_MAX_BYTES or digest in _PAGEWISE_CACHE:
+        return
+    _PAGEWISE_CACHE[digest] = [dict(p) for p in pages_data]
+    _PAGEWISE_CACHE_SIZES[digest] = size
+    _pagewise_cache_bytes += size
+    while _pagewise_cache_bytes > _PAGEWISE_CACHE_MAX_BYTES:
+        evicted, _ = _PAGEWISE_CACHE.popitem(last=False)
+        _pagewise_cache_bytes -= _PAGEWISE_CACHE_SIZES.pop(evicted)
+
+
+async def extract_pdf_markdown_pagewise_async(file_bytes: bytes) -> List[Dict[str, Any]]:
+    """Parallel variant of extract_pdf_markdown_pagewise for use inside request handlers.
+
+    Longer documents are split into shards of at least EXTRACT_SHARD_MIN_PAGES pages, each
+    extracted in the shared process pool, since pdfplumber's layout analysis is pure Python
+    and holds the GIL.
+    Results are memoised by content hash. If the pool fails the document is extracted serially,
+    so the result matches extract_pdf_markdown_pagewise.
+    """
+    if not file_bytes:
+        logger.warning("extract_pdf_markdown_pagewise_async: empty file bytes")
+        return []
+
+    digest = await asyncio.to_thread(lambda: hashlib.sha256(file_bytes).hexdigest())
+    cached = _PAGEWISE_CACHE.get(digest)
+    if cached is not None:
+        _PAGEWISE_CACHE.move_to_end(digest)
+        logger.info("extract_pdf_markdown_pagewise_async: cache hit pages=%d", len(cached))
+        return [dict(p) for p in cached]
+
+    pages_data = await _extract_pdf_markdown_pagewise_sharded(file_bytes)
+    # Empty results are not cached so a transient failure can be retried
+    if pages_data:
+        _pagewise_cache_put(digest, pages_data)
+    return pages_data
+
+
+def _write_temp_pdf(file_bytes: bytes) -> str:
+    """Spill the document to a temp file the pool workers can open by path."""
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(file_bytes)
+    return tmp.name
+
+
+async def _extract_pdf_markdown_pagewise_sharded(file_bytes: bytes) -> List[Dict[str, Any]]:
+    try:
+        page_count = len(PdfReader(io.BytesIO(file_bytes)).pages)
+    except Exception as e:
+        logger.warning("extract_pdf_markdown_pagewise_async: page count failed, extracting serially: %s", e)
+        return await asyncio.to_thread(extract_pdf_markdown_pagewise, file_bytes)
+
+    # Short documents are not worth the process round-trips
+    shards = min(page_count // FileProcessingConfigs.EXTRACT_SHARD_MIN_PAGES, FileProcessingConfigs.EXTRACT_WORKERS)
+    if shards <= 1:
+        return await asyncio.to_thread(extract_pdf_markdown_pagewise, file_bytes)
+
+    step = -(-page_count // shards)
+    loop = asyncio.get_running_loop()
+    pdf_path = None
+    try:
+        pdf_path = await asyncio.to_thread(_write_temp_pdf, file_bytes)
+        pool = _get_extract_pool()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(pool, _extract_page_range_markdown, pdf_path, start, min(start + step, page_count))
+            for start in range(0, page_count, step)
+        ))
+    except BrokenProcessPool as e:
+        # A crashed worker poisons the pool; tear it down so the next call starts a fresh one
+        global _EXTRACT_POOL
+        if _EXTRACT_POOL is pool:
+            _EXTRACT_POOL = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        logger.exception("extract_pdf_markdown_pagewise_async: extraction pool broke, extracting serially: %s", e)
+        return await asyncio.to_thread(extract_pdf_markdown_pagewise, file_bytes)
+    except Exception as e:
+        logger.exception("extract_pdf_markdown_pagewise_async: sharded extraction failed, extracting serially: %s", e)
+        return await asyncio.to_thread(extract_pdf_markdown_pagewise, file_bytes)
+    finally:
+        if pdf_path is not None:
+            try:
+                os.unlink(pdf_path)
+            except OSError:
+                pass
+
+    pages_data = [page for shard in results for page in shard]
+    total_chars = sum(len(p["markdown"]) for p in pages_data)
+    logger.info(f"extract_pdf_markdown_pagewise_async: extracted {len(pages_data)} pages in {shards} shards, total chars={total_chars}")
+    return pages_data
+
+
 def extract_pdf_markdown(file_bytes: bytes) -> str:
     """Extract Markdown from PDF bytes using pdfplumber with heuristics for headings, lists, code, and tables.
 
@@ -375,7 +578,10 @@ def extract_pdf_markdown(file_bytes: bytes) -> str:
         with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
             for page in pdf.pages:
                 # Use helper function to extract single page markdown
-                page_md = _extract_single_page_markdown(page)
+                try:
+                    page_md = _extract_single_page_markdown(page)
+                finally:
+                    page.close()
                 if page_md:
                     out_lines.append(page_md)
                     # Add page separator for multi-page documents
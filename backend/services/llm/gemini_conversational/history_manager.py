@@ -307,15 +307,19 @@ class ChatHistoryManager:
         try:
             from models.usecase.usecase import UsecaseMetadata
             
-            # Find the usecase record
-            record = db.query(UsecaseMetadata).filter(
+            # Single UPDATE; callers already hold the history, so no need to load the row first
+            updated = db.query(UsecaseMetadata).filter(
                 UsecaseMetadata.usecase_id == usecase_id,
                 UsecaseMetadata.is_deleted == False
-            ).first()
+            ).update(
+                {
+                    UsecaseMetadata.chat_history: updated_history,
+                    UsecaseMetadata.chat_summary: updated_summary,
+                },
+                synchronize_session="fetch",
+            )
             
-            if record:
-                record.chat_history = updated_history
-                record.chat_summary = updated_summary
+            if updated:
                 db.commit()
                 
                 logger.info(f"Updated database for usecase {usecase_id} with summarized history")
@@ -1,10 +1,39 @@
 import asyncio
-import io
 import os
+import random
 import aiohttp
 
 
+class AssetInvocationError(Exception):
+    """Raised when the asset reports a GenaiBaseException for a trace."""
+
+
+# Upper bound on concurrent connections to the asset API from one invoker
+_MAX_CONNECTIONS = 100
+# Longest wait between retries, including server-requested Retry-After delays
+_MAX_RETRY_DELAY_S = 30
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _retry_delay(attempt, error):
+    # Full-range jitter around exponential backoff so concurrent callers spread out;
+    # a Retry-After header (seconds) raises the floor, capped at _MAX_RETRY_DELAY_S
+    delay = min(_MAX_RETRY_DELAY_S, 2 ** attempt) * (0.5 + random.random())
+    if isinstance(error, aiohttp.ClientResponseError) and error.headers:
+        try:
+            delay = max(delay, float(error.headers.get("Retry-After", 0)))
+        except ValueError:
+            pass
+    return min(_MAX_RETRY_DELAY_S, delay)
+
+
 class AssetInvoker:
+    """Client for the image-to-text asset API.
+
+    Requests share one aiohttp session, bound to the event loop that opened it. Use the
+    invoker as ``async with AssetInvoker(...) as invoker:`` or call ``close()`` when done.
+    """
+
     def __init__(self, api_key, username, password, asset_id):
         self.api_key = api_key
         self.username = username
@@ -16,43 +45,71 @@ class AssetInvoker:
             'username': self.username,
             'password': self.password
         }
+        self._session = None
+        self._session_loop = None
+
+    def _get_session(self):
+        # One keep-alive connection pool reused by every token, upload and poll request.
+        # aiohttp sessions cannot cross event loops, and the open one can only be closed on
+        # its own loop, so a call from another loop is refused rather than leaking it.
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._session_loop is not loop:
+            raise RuntimeError("AssetInvoker session is bound to another event loop; close() it there first")
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=_MAX_CONNECTIONS, limit_per_host=_MAX_CONNECTIONS)
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed and self._session_loop is asyncio.get_running_loop():
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
 
     async def get_access_token(self):
-        async with aiohttp.ClientSession() as session:
-            async with session.get("https://api.intellectseecstag.com/accesstoken/idxpigtb", headers=self.headers_QA) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('access_token', '')
-                return ""
+        session = self._get_session()
+        async with session.get("https://api.intellectseecstag.com/accesstoken/idxpigtb", headers=self.headers_QA) as response:
+            if response.status == 200:
+                data = await response.json()
+                return data.get('access_token', '')
+            return ""
 
     async def asset_post(self, asset_headers, asset_payload, files):
         url = "https://api.intellectseecstag.com/magicplatform/v1/invokeasset/" + self.asset_id + "/genai"
-        async with aiohttp.ClientSession() as session:
-            form = aiohttp.FormData()
-            for field, file_info in files:
-                filename, file_obj, content_type = file_info
-                form.add_field(field, file_obj, filename=filename, content_type=content_type)
-            async with session.post(url, headers=asset_headers, data=form) as response:
-                json_response = await response.json()
-                trace_id = json_response["trace_id"]
-                return trace_id
+        session = self._get_session()
+        form = aiohttp.FormData()
+        for field, file_info in files:
+            filename, file_obj, content_type = file_info
+            form.add_field(field, file_obj, filename=filename, content_type=content_type)
+        async with session.post(url, headers=asset_headers, data=form) as response:
+            response.raise_for_status()
+            json_response = await response.json()
+            trace_id = json_response["trace_id"]
+            return trace_id
 
     async def get_chunks(self, asset_headers, trace_id):
         status = ""
-        async with aiohttp.ClientSession() as session:
-            while status != "COMPLETED":
-                url = "https://api.intellectseecstag.com/magicplatform/v1/invokeasset/" + self.asset_id + "/" + trace_id
-                async with session.get(url, headers=asset_headers) as response:
-                    data = await response.json()
-                try:
-                    if data.get('error_code') == "GenaiBaseException":
-                        raise Exception(data.get('error_description'))
-                except Exception:
-                    pass
-                await asyncio.sleep(2)
-                status = data.get('status', "")
-                if status == "COMPLETED":
-                    return data
+        session = self._get_session()
+        while status != "COMPLETED":
+            url = "https://api.intellectseecstag.com/magicplatform/v1/invokeasset/" + self.asset_id + "/" + trace_id
+            async with session.get(url, headers=asset_headers) as response:
+                response.raise_for_status()
+                data = await response.json()
+            if data.get('error_code') == "GenaiBaseException":
+                raise AssetInvocationError(data.get('error_description'))
+            status = data.get('status', "")
+            if status == "COMPLETED":
+                return data
+            # Only wait between polls that are still pending
+            await asyncio.sleep(2)
 
     async def _invoke_asset_internal(self, filepaths):
         access_token = await self.get_access_token()
@@ -63,18 +120,32 @@ class AssetInvoker:
         }
         asset_payload = {}
         files = []
-        for fp in filepaths:
-            with open(fp, 'rb') as f:
-                file_bytes = f.read()
-            file_obj = io.BytesIO(file_bytes)
-            file_obj.seek(0)
-            files.append(('Image', (os.path.basename(fp), file_obj, 'image/jpeg')))
+        for item in filepaths:
+            # Items are file paths or in-memory (filename, bytes) pairs; bytes go into the
+            # multipart form as-is without a BytesIO copy
+            if isinstance(item, tuple):
+                filename, file_bytes = item
+            else:
+                filename = os.path.basename(item)
+                with open(item, 'rb') as f:
+                    file_bytes = f.read()
+            files.append(('Image', (filename, file_bytes, 'image/jpeg')))
         trace_id = await self.asset_post(asset_headers, asset_payload, files)
         output = await self.get_chunks(asset_headers, trace_id)
         responses = [entry["debug_logs"][0]["raw_response"] for entry in output["response"]["output"]]
         return responses
 
-    async def invoke_asset(self, filepaths):
-        return await asyncio.wait_for(self._invoke_asset_internal(filepaths), timeout=400)
+    async def invoke_asset(self, filepaths, max_retries=3):
+        # Transport errors, timeouts, 429s and 5xx responses are retried with jittered
+        # exponential backoff; other HTTP errors and asset-reported errors surface immediately
+        for attempt in range(max_retries + 1):
+            try:
+                return await asyncio.wait_for(self._invoke_asset_internal(filepaths), timeout=400)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status not in _RETRYABLE_STATUSES:
+                    raise
+                if attempt == max_retries:
+                    raise
+                await asyncio.sleep(_retry_delay(attempt, e))
 
 
@@ -0,0 +1,95 @@
+"""
+Tests for agent trace collection and the batched trace writer
+"""
+
+import sys
+import os
+import json
+from contextlib import contextmanager
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from services.agent import callbacks
+from services.agent.agent_runner import TraceCollector, _MAX_TRACE_TOOL_CALLS
+
+
+class _RecordingSession:
+    """Stands in for a DB session: records inserted batches, rejects rows marked bad"""
+
+    def __init__(self, written):
+        self.written = written
+
+    def execute(self, stmt, rows):
+        if any(row.get("bad") for row in rows):
+            raise ValueError("unserializable row")
+        self.written.append([row["step_number"] for row in rows])
+
+    def commit(self):
+        pass
+
+
+def _patch_db(monkeypatch):
+    written = []
+
+    @contextmanager
+    def fake_db_context():
+        yield _RecordingSession(written)
+
+    monkeypatch.setattr(callbacks, "get_db_context", fake_db_context)
+    return written
+
+
+def test_write_batch_single_insert(monkeypatch):
+    """A clean batch is written with one multi-row insert"""
+    written = _patch_db(monkeypatch)
+    callbacks._write_batch([{"step_number": 1}, {"step_number": 2}, {"step_number": 3}])
+    assert written == [[1, 2, 3]]
+
+
+def test_write_batch_falls_back_to_rows(monkeypatch):
+    """One bad row splits the batch into per-row writes and only the bad row is dropped"""
+    written = _patch_db(monkeypatch)
+    callbacks._write_batch([
+        {"step_number": 1},
+        {"step_number": 2, "bad": True},
+        {"step_number": 3},
+    ])
+    assert written == [[1], [3]]
+
+
+def test_trace_collector_dump_shape():
+    """dump() returns plain lists and ISO timestamps without the internal timing keys"""
+    tracer = TraceCollector()
+    tracer.set_engine("deepagents")
+    done = tracer.start_tool("get_usecase_status", "{}")
+    tracer.finish_tool(done, ok=True, result_preview="ok")
+    tracer.start_tool("get_documents_markdown", "{}")
+
+    data = tracer.dump()
+
+    assert data["engine"] == "deepagents"
+    assert data["turn_started_at"].endswith("Z")
+    assert isinstance(data["tool_calls"], list)
+    finished, pending = data["tool_calls"]
+    assert not any(k.startswith("_") for call in data["tool_calls"] for k in call)
+    assert finished["name"] == "get_usecase_status"
+    assert finished["ok"] is True
+    assert finished["started_at"].endswith("Z") and finished["finished_at"].endswith("Z")
+    assert finished["started_at"] <= finished["finished_at"]
+    assert pending["started_at"].endswith("Z")
+    assert pending["finished_at"] is None
+    assert json.loads(json.dumps(data)) == data
+
+
+def test_trace_collector_keeps_latest_tool_calls():
+    """The tool call buffer is bounded and keeps the most recent calls"""
+    tracer = TraceCollector()
+    for i in range(_MAX_TRACE_TOOL_CALLS + 5):
+        tracer.start_tool(f"tool_{i}", "")
+
+    tool_calls = tracer.dump()["tool_calls"]
+
+    assert len(tool_calls) == _MAX_TRACE_TOOL_CALLS
+    assert tool_calls[0]["name"] == "tool_5"
+    assert tracer.was_called("tool_0")
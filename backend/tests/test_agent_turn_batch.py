@@ -0,0 +1,59 @@
+"""
+Tests for run_agent_turn_batch concurrency, ordering and error handling
+"""
+
+import sys
+import os
+import asyncio
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from services.agent import agent_runner
+
+
+def _patch_turn(monkeypatch, fail_on=()):
+    """Replace the per-turn call with a fake that records peak concurrency"""
+    state = {"in_flight": 0, "peak": 0}
+
+    async def fake_turn(usecase_id, user_message, model=None):
+        state["in_flight"] += 1
+        state["peak"] = max(state["peak"], state["in_flight"])
+        try:
+            # Later requests finish first, so ordering cannot come from completion order
+            await asyncio.sleep(0.01 * (10 - usecase_id))
+            if usecase_id in fail_on:
+                raise RuntimeError(f"turn {usecase_id} failed")
+            return f"{user_message}:{model}", {"usecase_id": usecase_id}
+        finally:
+            state["in_flight"] -= 1
+
+    monkeypatch.setattr(agent_runner, "run_agent_turn_async", fake_turn)
+    return state
+
+
+def test_batch_respects_concurrency_bound(monkeypatch):
+    """No more than max_concurrency turns run at once"""
+    state = _patch_turn(monkeypatch)
+    requests = [(i, f"msg{i}") for i in range(8)]
+    asyncio.run(agent_runner.run_agent_turn_batch(requests, max_concurrency=3))
+    assert state["peak"] == 3
+
+
+def test_batch_preserves_input_order(monkeypatch):
+    """Results line up with the input requests, not with completion order"""
+    _patch_turn(monkeypatch)
+    requests = [(i, f"msg{i}") for i in range(5)]
+    results = asyncio.run(agent_runner.run_agent_turn_batch(requests, model="m", max_concurrency=5))
+    assert [text for text, _ in results] == [f"msg{i}:m" for i in range(5)]
+    assert [traces["usecase_id"] for _, traces in results] == list(range(5))
+
+
+def test_batch_returns_per_item_exceptions(monkeypatch):
+    """A failing turn yields its exception in place; the other turns still complete"""
+    _patch_turn(monkeypatch, fail_on={1})
+    requests = [(i, f"msg{i}") for i in range(3)]
+    results = asyncio.run(agent_runner.run_agent_turn_batch(requests, max_concurrency=2))
+    assert isinstance(results[1], RuntimeError)
+    assert results[0] == ("msg0:None", {"usecase_id": 0})
+    assert results[2] == ("msg2:None", {"usecase_id": 2})
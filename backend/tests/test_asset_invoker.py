@@ -0,0 +1,81 @@
+"""
+Tests for the AssetInvoker retry backoff
+"""
+
+import sys
+import os
+import asyncio
+
+import aiohttp
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from services.llm.pf_image2text_automation import asset_invoker
+from services.llm.pf_image2text_automation.asset_invoker import _MAX_RETRY_DELAY_S, _retry_delay
+
+
+def _response_error(status, headers=None):
+    return aiohttp.ClientResponseError(request_info=None, history=(), status=status, headers=headers)
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    # random() == 0.5 makes the jitter factor exactly 1
+    monkeypatch.setattr(asset_invoker.random, "random", lambda: 0.5)
+
+
+def test_retry_delay_exponential_backoff(no_jitter):
+    """Without Retry-After the delay doubles per attempt up to the cap"""
+    assert _retry_delay(0, aiohttp.ClientConnectionError()) == 1
+    assert _retry_delay(3, aiohttp.ClientConnectionError()) == 8
+    assert _retry_delay(10, aiohttp.ClientConnectionError()) == _MAX_RETRY_DELAY_S
+
+
+def test_retry_delay_honours_retry_after(no_jitter):
+    """A Retry-After in seconds raises the delay above the backoff"""
+    assert _retry_delay(1, _response_error(429, {"Retry-After": "7"})) == 7
+
+
+def test_retry_delay_keeps_longer_backoff(no_jitter):
+    """A Retry-After shorter than the backoff does not shorten it"""
+    assert _retry_delay(4, _response_error(503, {"Retry-After": "1"})) == 16
+
+
+def test_retry_delay_caps_retry_after(no_jitter):
+    """Server-requested delays are capped"""
+    assert _retry_delay(0, _response_error(429, {"Retry-After": "120"})) == _MAX_RETRY_DELAY_S
+
+
+def test_retry_delay_ignores_http_date_retry_after(no_jitter):
+    """Non-numeric Retry-After values (HTTP dates) fall back to the backoff"""
+    error = _response_error(503, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+    assert _retry_delay(2, error) == 4
+
+
+def test_retry_delay_jitter_range(monkeypatch):
+    """Jitter spreads the delay between half and one and a half times the backoff"""
+    monkeypatch.setattr(asset_invoker.random, "random", lambda: 0.0)
+    assert _retry_delay(2, asyncio.TimeoutError()) == 2
+    monkeypatch.setattr(asset_invoker.random, "random", lambda: 0.999)
+    assert 5.99 < _retry_delay(2, asyncio.TimeoutError()) < 6
+
+
+def test_session_refused_from_second_loop():
+    """An open session is not silently replaced (and leaked) when another loop uses the invoker"""
+    invoker = asset_invoker.AssetInvoker("key", "user", "pass", "asset")
+
+    async def _open():
+        return invoker._get_session()
+
+    first_loop = asyncio.new_event_loop()
+    try:
+        session = first_loop.run_until_complete(_open())
+        with pytest.raises(RuntimeError):
+            asyncio.run(_open())
+        assert invoker._session is session
+        first_loop.run_until_complete(invoker.close())
+        assert session.closed
+    finally:
+        first_loop.close()
@@ -0,0 +1,95 @@
+"""
+Tests for the OCR bookkeeping in the file upload endpoint
+"""
+
+import sys
+import os
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+# Add the parent directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../')))
+
+from api.v1.endpoints.file_processing import _ocr_completion_counts, _ocr_rows
+from models import FileMetadata, FileWorkflowTracker
+
+
+def test_ocr_rows_builds_one_insert_row_per_page():
+    """Every extracted page becomes one completed OCROutputs row and one pages_json entry"""
+    file_id = uuid4()
+    pages_data = [
+        {"page_number": 1, "markdown": "# Title"},
+        {"page_number": 2, "markdown": None},
+        {"page_number": 3, "markdown": "body"},
+    ]
+
+    pages_json, rows = _ocr_rows(file_id, pages_data)
+
+    assert pages_json == {"1": "# Title", "2": "", "3": "body"}
+    assert rows == [
+        {"file_id": file_id, "page_number": 1, "page_text": "# Title", "error_msg": None, "is_completed": True},
+        {"file_id": file_id, "page_number": 2, "page_text": "", "error_msg": None, "is_completed": True},
+        {"file_id": file_id, "page_number": 3, "page_text": "body", "error_msg": None, "is_completed": True},
+    ]
+
+
+def test_ocr_rows_empty_document():
+    """A document without pages produces no rows to insert"""
+    pages_json, rows = _ocr_rows(uuid4(), [])
+    assert pages_json == {}
+    assert rows == []
+
+
+@pytest.fixture
+def completion_db():
+    """In-memory database with file_metadata and a tracker table that, like older
+    deployments, has no primary key and so can hold duplicate rows per file"""
+    engine = create_engine("sqlite://")
+    FileMetadata.__table__.create(engine)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE file_workflow_tracker ("
+            "file_id CHAR(32), text_extraction VARCHAR(50), requirement_generation VARCHAR(50), "
+            "scenario_generation VARCHAR(50), test_case_generation VARCHAR(50), "
+            "test_data_generation VARCHAR(50), test_script_generation VARCHAR(50), "
+            "error_msg TEXT, is_deleted BOOLEAN)"
+        ))
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add_file(db, usecase_id, *tracker_statuses):
+    file_id = uuid4()
+    db.execute(insert(FileMetadata.__table__).values(
+        file_id=file_id, usecase_id=usecase_id, user_id=uuid4(),
+        file_name="doc.pdf", file_link="/uploads/doc.pdf",
+    ))
+    for status in tracker_statuses:
+        db.execute(insert(FileWorkflowTracker.__table__).values(file_id=file_id, text_extraction=status))
+    return file_id
+
+
+def test_ocr_completion_counts(completion_db):
+    """Files, tracked files and completed files are counted per usecase"""
+    usecase_id = uuid4()
+    _add_file(completion_db, usecase_id, "Completed")
+    _add_file(completion_db, usecase_id, "In Progress")
+    _add_file(completion_db, usecase_id)
+    _add_file(completion_db, uuid4(), "Completed")
+
+    assert tuple(_ocr_completion_counts(completion_db, usecase_id)) == (3, 2, 1)
+
+
+def test_ocr_completion_counts_duplicate_tracker_rows(completion_db):
+    """A file with several tracker rows is counted once, and is only completed when all its rows are"""
+    usecase_id = uuid4()
+    _add_file(completion_db, usecase_id, "Completed", "Completed")
+    _add_file(completion_db, usecase_id, "In Progress", "Completed")
+    _add_file(completion_db, usecase_id, "In Progress")
+
+    assert tuple(_ocr_completion_counts(completion_db, usecase_id)) == (3, 3, 1)